@@ -4,7 +4,7 @@ import json
 import re
 from typing import Any, Dict, List
 
-from langchain_openai import ChatOpenAI
+from app.llm import get_llm
 
 
 SYSTEM = """You are a continuation detector for a conversational assistant.
@@ -163,7 +163,7 @@ def _quick_heuristic(user_message: str, session: Dict[str, Any]) -> bool | None:
 
 
 
-def detect_continuation(user_message: str, session: Dict[str, Any]) -> Dict[str, bool]:
+async def detect_continuation(user_message: str, session: Dict[str, Any]) -> Dict[str, bool]:
     """
     Decide whether this turn is a continuation of the current thread,
     which can be answered from session['last_result'] context.
@@ -176,7 +176,7 @@ def detect_continuation(user_message: str, session: Dict[str, Any]) -> Dict[str,
         return {"is_continuation": bool(h)}
 
     # 2) LLM classification
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    llm = get_llm(max_tokens=16, json_mode=True)  # {"is_continuation": bool}
 
     context = {
         "last_intent_topic": (session.get("last_intent") or {}).get("topic"),
@@ -191,7 +191,7 @@ def detect_continuation(user_message: str, session: Dict[str, Any]) -> Dict[str,
     ]
 
     try:
-        resp = llm.invoke(msgs).content
+        resp = (await llm.ainvoke(msgs)).content
         data = json.loads(resp)
         is_cont = bool(data.get("is_continuation"))
         return {"is_continuation": is_cont}
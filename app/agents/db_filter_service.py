@@ -72,14 +72,14 @@ def _prepare_filters(required_fields: Dict[str, Any]) -> Tuple[List[str], List[A
     return where_parts, params, applied, skipped
 
 
-def _build_sql(where_parts: List[str], order_by: Optional[str], limit: int, offset: int) -> str:
+def _build_sql(where_parts: List[str], order_by: Optional[str]) -> str:
     # order only by safe, guaranteed columns to avoid UndefinedColumn
     safe_order = order_by if order_by in {"name", "workload", "incentive_type"} else "name"
     sql = f"SELECT * FROM {TABLE_NAME}"
     if where_parts:
         sql += " WHERE " + " AND ".join(where_parts)
     sql += f" ORDER BY {safe_order}"
-    sql += " LIMIT %s OFFSET %s"
+    sql += " LIMIT %s"
     return sql
 
 
@@ -89,14 +89,12 @@ class FilterResult:
     applied_filters: Dict[str, List[str]]
     skipped_fields: List[str]
     limit: int
-    offset: int
     count: int
 
 
-def filter_incentives(required_fields: Dict[str, Any],
+async def filter_incentives(required_fields: Dict[str, Any],
                       *,
                       limit: int = 25,
-                      offset: int = 0,
                       order_by: Optional[str] = "name") -> FilterResult:
     """
     Filter incentives by ONLY {name, workload, incentive_type}.
@@ -104,20 +102,20 @@ def filter_incentives(required_fields: Dict[str, Any],
     - name, incentive_type: case-insensitive exact equality with IN (...)
     - AND across different fields
     - Ignores/marks skipped any other fields (segment, country/market, etc.)
+    - first `limit` rows only: callers answer from one page, so there is no OFFSET to scan
     """
     where_parts, params, applied_filters, skipped_fields = _prepare_filters(required_fields or {})
 
-    sql = _build_sql(where_parts, order_by, limit, offset)
-    params = params + [limit, offset]
+    sql = _build_sql(where_parts, order_by)
+    params = params + [limit]
 
     # NOTE: adapt this if your qall signature expects *params
-    rows = qall(sql, params)
+    rows = await qall(sql, params)
 
     return FilterResult(
         rows=rows or [],
         applied_filters=applied_filters,
         skipped_fields=skipped_fields,
         limit=limit,
-        offset=offset,
         count=len(rows or []),
     )
@@ -195,20 +195,23 @@ def _load_syns_and_lists():
 # ---------- catalog (names/workloads from DB) ----------
 _catalog: Dict[str, List[str]] = {"names": [], "workloads": []}
 
-def _load_catalog() -> Dict[str, List[str]]:
+async def load_catalog() -> Dict[str, List[str]]:
     """
-    Fetch distinct canonical values from incentives table (cached)
+    Fetch distinct canonical values from incentives table (cached; one query per missing list)
     + extend workloads with static list file if provided.
+    Awaited by the API before field_validator_v1, which then only reads the cache.
     """
     _load_syns_and_lists()
+    if _catalog["names"] and _catalog["workloads"]:
+        return _catalog
 
     if not _catalog["names"]:
-        rows = qall("SELECT DISTINCT name FROM incentives WHERE name IS NOT NULL ORDER BY 1;")
-        _catalog["names"] = [r["name"] for r in rows if r.get("name")]
+        name_rows = await qall("SELECT DISTINCT name FROM incentives WHERE name IS NOT NULL ORDER BY 1;")
+        _catalog["names"] = [r["name"] for r in name_rows if r.get("name")]
 
     if not _catalog["workloads"]:
-        rows = qall("SELECT DISTINCT workload FROM incentives WHERE workload IS NOT NULL ORDER BY 1;")
-        db_vals = [r["workload"] for r in rows if r.get("workload")]
+        wl_rows = await qall("SELECT DISTINCT workload FROM incentives WHERE workload IS NOT NULL ORDER BY 1;")
+        db_vals = [r["workload"] for r in wl_rows if r.get("workload")]
         # merge with static list (keeps DB as source of truth but enriches)
         merged = set(db_vals)
         for w in (_WL_LIST or []):
@@ -218,6 +221,15 @@ def _load_catalog() -> Dict[str, List[str]]:
 
     return _catalog
 
+def catalog_ready() -> bool:
+    """True once load_catalog has filled both lists (results computed before that are partial)."""
+    return bool(_catalog["names"] and _catalog["workloads"])
+
+def _load_catalog() -> Dict[str, List[str]]:
+    """Cached catalog (filled by load_catalog); the validator itself never touches the DB."""
+    _load_syns_and_lists()
+    return _catalog
+
 # ---------- matching helpers (synonyms + partial + fuzzy) ----------
 def _synonym_candidates(msg: str, mapping: Dict[str, List[str]],
                         exact_score: int = 100, contains_score: int = 96, token_subset_score: int = 93
@@ -25,7 +25,7 @@ import json
 import re
 
 from rapidfuzz import process, fuzz
-from langchain_openai import ChatOpenAI
+from app.llm import get_llm
 import pycountry
 
 
@@ -242,14 +242,14 @@ _MARKET_SYSTEM = (
     'Output STRICT JSON only: {"country": "<Name or ISO code>" | null}'
 )
 
-def _extract_country_with_llm(user_message: str) -> Optional[str]:
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+async def _extract_country_with_llm(user_message: str) -> Optional[str]:
+    llm = get_llm(max_tokens=24, json_mode=True)  # {"country": ...}
     msgs = [
         {"role": "system", "content": _MARKET_SYSTEM},
         {"role": "user", "content": user_message or ""}
     ]
     try:
-        resp = llm.invoke(msgs).content
+        resp = (await llm.ainvoke(msgs)).content
         data = json.loads(resp)
         c = data.get("country")
         return c.strip() if isinstance(c, str) and c.strip() else None
@@ -370,7 +370,7 @@ def _extract_hours_value(msg: str) -> Optional[str]:
 
 
 # ---------- public API ----------
-def resolve_field_from_message(field_name: str, user_message: str) -> Dict[str, Any]:
+async def resolve_field_from_message(field_name: str, user_message: str) -> Dict[str, Any]:
     """
     Resolve a SINGLE field from a fresh user message.
 
@@ -411,7 +411,7 @@ def resolve_field_from_message(field_name: str, user_message: str) -> Dict[str,
         return {"field_name": field_name, "value": v, "candidates": cands}
 
     if f == "country":
-        candidate = _extract_country_with_llm(msg)
+        candidate = await _extract_country_with_llm(msg)
         valid = _validate_country_iso(candidate)
         return {"field_name": field_name, "value": valid, "candidates": []}
 
@@ -1,32 +1,37 @@
 # app/agents/final_answer_agent.py
 from __future__ import annotations
 
+import decimal
 import json
 import re
 from typing import Any, Dict, List
 import math
 
-from langchain_openai import ChatOpenAI
+from app.llm import get_llm
 
 def _one(v):
     if isinstance(v, list) and v: return v[0]
     return v
 
+# support 10k / 100k / 1m style
+_NUM_SUFFIX_RX = re.compile(r"([0-9]*\.?[0-9]+)\s*([km]?)")
+_NON_NUMERIC_RX = re.compile(r"[^0-9.\-]")
+_SUFFIX_MULT = {"": 1.0, "k": 1_000.0, "m": 1_000_000.0}
+
 def _to_float(v):
     if v is None: return None
+    # fast path: typed numbers never touch the string/regex code
+    t = type(v)
+    if t is float: return v
+    if t is int: return float(v)
     if isinstance(v, (int, float)): return float(v)
     s = str(v).strip().lower().replace(",", "")
-    # support 10k / 100k / 1m style
-    m = re.fullmatch(r"([0-9]*\.?[0-9]+)\s*([kKmM]?)", s)
+    m = _NUM_SUFFIX_RX.fullmatch(s)
     if not m:
         # last fallback: digits only
-        try: return float(re.sub(r"[^0-9.\-]", "", s))
+        try: return float(_NON_NUMERIC_RX.sub("", s))
         except: return None
-    num = float(m.group(1))
-    suf = m.group(2)
-    if suf in ("k","K"): num *= 1_000
-    elif suf in ("m","M"): num *= 1_000_000
-    return float(num)
+    return float(m.group(1)) * _SUFFIX_MULT[m.group(2)]
 
 def _norm_country(s):
     return re.sub(r"[^a-z0-9]+", " ", (s or "").lower()).strip()
@@ -48,7 +53,7 @@ def _pick_band(row, country):
     return "C"
 
 def _compute_presales_payout(row, country, acv, hours):
-    """Returns a dict with band, inputs, candidates and final payout (or can_compute=False)."""
+    """Returns a flat dict with band, the compared terms and final payout (or can_compute=False)."""
     band = _pick_band(row, country)
     key = band.lower()
 
@@ -59,35 +64,26 @@ def _compute_presales_payout(row, country, acv, hours):
     acv_f   = _to_float(acv)
     hours_f = _to_float(hours)
 
-    candidates = []
-
-    if percent is not None and acv_f is not None:
-        candidates.append(("percent_of_acv", float(percent) / 100.0 * acv_f))
-    if hourly is not None and hours_f is not None:
-        candidates.append(("hours_x_rate", float(hourly) * hours_f))
-    if cap is not None:
-        candidates.append(("cap", float(cap)))
+    # Missing terms compare as +inf so min() never picks them
+    poa  = float(percent) / 100.0 * acv_f if (percent is not None and acv_f is not None) else math.inf
+    hxr  = float(hourly) * hours_f if (hourly is not None and hours_f is not None) else math.inf
+    capv = float(cap) if cap is not None else math.inf
 
-    if not candidates:
+    payout = min(poa, hxr, capv)
+    if payout == math.inf:
         return {"can_compute": False, "reason": "Missing inputs/fields", "band": band}
 
-    winner = min(candidates, key=lambda kv: kv[1])
-    out = {
+    # Ties resolve in the same order as before: percent, hours, cap
+    limiter = "percent_of_acv" if payout == poa else ("hours_x_rate" if payout == hxr else "cap")
+    return {
         "can_compute": True,
         "band": band,
-        "inputs": {
-            "country": country,
-            "acv": acv_f,
-            "hours": hours_f,
-            "percent": percent,
-            "hourly_rate": hourly,
-            "cap": cap,
-        },
-        "candidates": {k: v for k, v in candidates},
-        "payout": winner[1],
-        "limiter": winner[0],
+        "payout": payout,
+        "limiter": limiter,
+        "pct_of_acv": poa if poa != math.inf else None,
+        "hours_x_rate": hxr if hxr != math.inf else None,
+        "cap": capv if capv != math.inf else None,
     }
-    return out
 
 def precompute_calcs(required_fields, rows):
     """Build PRECOMPUTED_CALC for the LLM. One entry per row."""
@@ -95,6 +91,7 @@ def precompute_calcs(required_fields, rows):
     acv     = _one((required_fields or {}).get("acv"))
     hours   = _one((required_fields or {}).get("hours"))
 
+    # Flat entries of primitives only: inputs already travel in REQUIRED_FIELDS.
     out = []
     for r in (rows or []):
         calc = _compute_presales_payout(r, country, acv, hours)
@@ -102,10 +99,11 @@ def precompute_calcs(required_fields, rows):
             "name": r.get("name"),
             "band": calc.get("band"),
             "can_compute": calc.get("can_compute", False),
-            "inputs": calc.get("inputs"),
-            "candidates": calc.get("candidates"),
             "payout": calc.get("payout"),
             "limiter": calc.get("limiter"),
+            "pct_of_acv": calc.get("pct_of_acv"),
+            "hours_x_rate": calc.get("hours_x_rate"),
+            "cap": calc.get("cap"),
         })
     return out
 
@@ -152,7 +150,7 @@ ROW SELECTION (apply in order)
 
 CALCULATIONS
 - If PRECOMPUTED_CALC is present, USE THOSE NUMBERS AS-IS (do not recompute).
-- Each entry includes: band (A/B/C), candidates used, limiter, and payout (if computable).
+- Each entry includes: band (A/B/C), the compared terms pct_of_acv, hours_x_rate and cap (null when not available), limiter, and payout (if computable).
 - If none are computable, say the calculation cannot be completed from the catalog and name the missing inputs.
 - When computable, state the band used and a one-line breakdown of the compared terms (percent-of-ACV, hours×rate, cap), then the final payout = minimum.
 
@@ -175,10 +173,9 @@ RECOMMENDATIONS
     -  "Interested in incentive earnings for this engagement?"
 """
 
-USER_TEMPLATE = """ORIGINAL_USER_MESSAGE:
-{original_user_message}
-
-REQUIRED_FIELDS (fully resolved):
+# Ordered from most stable to most volatile across turns of a session so the
+# shared prompt prefix (SYSTEM + early sections) stays cacheable server-side.
+USER_TEMPLATE = """REQUIRED_FIELDS (fully resolved):
 {required_fields_json}
 
 FILTER_RESULT_ROWS (use ONLY these rows):
@@ -187,6 +184,9 @@ FILTER_RESULT_ROWS (use ONLY these rows):
 PRECOMPUTED_CALC (use these numbers as-is; do not recompute):
 {precomputed_calc_json}
 
+ORIGINAL_USER_MESSAGE:
+{original_user_message}
+
 TASK
 1) Identify what the user actually asked for (e.g., activity requirements, partner qualification, customer eligibility, payout, goal, workloads, or a general eligibility question).
 2) Apply the ROW SELECTION and COLUMN-LOCKED rules.
@@ -195,8 +195,27 @@ TASK
 """
 
 
+def _json_default(o: Any):
+    # DB rows reach us straight from psycopg (Decimal, date, ...) rather than via a session round-trip
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    return str(o)
+
 def _safe_json(o: Any) -> str:
-    return json.dumps(o, ensure_ascii=False, indent=2)
+    # sort_keys: byte-identical output for identical data keeps cached prefixes matching
+    return json.dumps(o, ensure_ascii=False, indent=2, sort_keys=True, default=_json_default)
+
+
+# Long cells (e.g. activity_requirement) can blow up the prompt; cap them per row.
+MAX_CELL_CHARS = 1500
+_TRUNCATED = "…(truncated)"
+
+def _trim_rows(rows: List[Dict[str, Any]], max_chars: int = MAX_CELL_CHARS) -> List[Dict[str, Any]]:
+    return [
+        {k: (v[:max_chars] + _TRUNCATED if isinstance(v, str) and len(v) > max_chars else v)
+         for k, v in r.items()}
+        for r in rows
+    ]
 
 
 def _fallback_answer(original_user_message: str,
@@ -240,16 +259,92 @@ def _fallback_answer(original_user_message: str,
     }
 
 
+# ---- deterministic short-circuit (no LLM) ----
+
+# Cheap substring version of the ROUTING HINTS above: keywords -> answer column(s).
+# Over-matching is harmless: we only skip the LLM when EVERY matched column is empty,
+# so each group lists every column a question with that keyword could be about.
+_PARTNER_COLUMNS = ("partner_qualification", "solution_partner_designation", "partner_specialization")
+_ASK_HINTS = [
+    (("activity", "deliverable", "module", "requirement", "required", "hour"),
+     ("activity_requirement", "min_hours")),
+    # "eligible"/"qualify"/"requirements" can mean the customer's or the partner's side
+    (("eligib", "qualif", "requirement", "required", "criteria", "prerequisite", "stage", "status"),
+     ("customer_qualification",) + _PARTNER_COLUMNS),
+    (("partner", "specialization", "designation"),
+     _PARTNER_COLUMNS),
+    (("goal", "purpose", "outcome", "objective"),
+     ("goal",)),
+    (("workload", "product", "in scope", "sku"),
+     ("workload",)),
+    (("payout", "incentive", "fee", "earning", "rate", "band", "funding", "market", "cap", "maximum", "how much"),
+     ("earning_type", "maximum_incentive_earning",
+      "incentive_market_a", "incentive_market_b", "incentive_market_c",
+      "market_a_definition", "market_b_definition", "market_c_definition",
+      "workshop_rate_hourly_a", "workshop_rate_hourly_b", "workshop_rate_hourly_c",
+      "enterprise_rate", "smec_rate")),
+]
+
+_NOT_LISTED = "That detail isn’t listed in the catalog entry."
+
+_CLAUSE_SPLIT = re.compile(r"[?;,]|\b(?:and|or|also|plus)\b", re.IGNORECASE)
+
+def _asked_columns(message: str) -> List[str]:
+    """
+    Columns the question asks about; empty unless every clause maps to one of them
+    ("What is the goal and who can deliver it?" is not fully covered by "goal").
+    """
+    cols: List[str] = []
+    for clause in _CLAUSE_SPLIT.split((message or "").lower()):
+        if not re.search(r"\w", clause):
+            continue
+        hits = [columns for keywords, columns in _ASK_HINTS if any(k in clause for k in keywords)]
+        if not hits:
+            return []
+        for columns in hits:
+            cols.extend(c for c in columns if c not in cols)
+    return cols
+
+def _is_empty_cell(v: Any) -> bool:
+    return v is None or (isinstance(v, str) and not v.strip())
+
+def _direct_answer(original_user_message: str,
+                   required_fields: Dict[str, Any],
+                   filter_result: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """
+    Answer without the LLM when the model would only degrade to the fallback:
+    - no rows at all
+    - the asked column(s) are empty in every row
+    Returns None when the LLM is needed.
+    """
+    if not filter_result:
+        fb = _fallback_answer(original_user_message, required_fields, filter_result)
+        fb["recommendations"] = _normalize_recommendations(fb.get("recommendations") or [])
+        return fb
+
+    cols = _asked_columns(original_user_message)
+    if not cols:
+        return None
+    if any(not _is_empty_cell(r.get(c)) for r in filter_result for c in cols):
+        return None
+
+    fb = _fallback_answer(original_user_message, required_fields, filter_result)
+    return {
+        "answer_text": _NOT_LISTED,
+        "recommendations": _normalize_recommendations(fb.get("recommendations") or []),
+    }
+
+
 # ---- post-processing to enforce phrasing ----
 
 _I_CAN_PREFIX = re.compile(r"^\s*i\s+can\s+", re.IGNORECASE)
 
+# Basic swaps so questions read naturally from user → agent (one pass, one lookup per match)
+_PRONOUNS = re.compile(r"\b(your|yours|you)\b", re.IGNORECASE)
+_PRONOUN_MAP = {"your": "my", "yours": "mine", "you": "me"}
+
 def _flip_pronouns(text: str) -> str:
-    # Basic swaps so questions read naturally from user → agent
-    text = re.sub(r"\byour\b", "my", text, flags=re.IGNORECASE)
-    text = re.sub(r"\byours\b", "mine", text, flags=re.IGNORECASE)
-    text = re.sub(r"\byou\b", "me", text, flags=re.IGNORECASE)
-    return text
+    return _PRONOUNS.sub(lambda m: _PRONOUN_MAP[m.group(1).lower()], text)
 
 def _to_question(text: str) -> str:
     t = (text or "").strip().rstrip(".")
@@ -290,9 +385,9 @@ def _normalize_recommendations(recs: List[str]) -> List[str]:
     return uniq[:5]  # cap for UI sanity
 
 
-def generate_final_answer(original_user_message: str,
-                          required_fields: Dict[str, Any],
-                          filter_result: List[Dict[str, Any]]) -> Dict[str, Any]:
+async def generate_final_answer(original_user_message: str,
+                                required_fields: Dict[str, Any],
+                                filter_result: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Returns:
       {
@@ -300,10 +395,15 @@ def generate_final_answer(original_user_message: str,
         "recommendations": List[str]
       }
     """
+    # Degenerate cases (no rows / asked detail missing everywhere) skip the LLM round-trip
+    direct = _direct_answer(original_user_message, required_fields or {}, filter_result or [])
+    if direct is not None:
+        return direct
+
     # Precompute deterministic payout math so the LLM only narrates
     precomp = precompute_calcs(required_fields or {}, filter_result or [])
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    llm = get_llm("gpt-4o")
     msgs = [
         {"role": "system", "content": SYSTEM},
         {
@@ -311,14 +411,14 @@ def generate_final_answer(original_user_message: str,
             "content": USER_TEMPLATE.format(
                 original_user_message=original_user_message,
                 required_fields_json=_safe_json(required_fields or {}),
-                filter_result_json=_safe_json(filter_result or []),
+                filter_result_json=_safe_json(_trim_rows(filter_result or [])),
                 precomputed_calc_json=_safe_json(precomp or []),
             ),
         },
     ]
 
     try:
-        resp = llm.invoke(msgs).content
+        resp = (await llm.ainvoke(msgs)).content
         data = json.loads(resp)
 
         answer = (data or {}).get("answer_text")
@@ -338,4 +438,4 @@ def generate_final_answer(original_user_message: str,
     except Exception:
         fb = _fallback_answer(original_user_message, required_fields, filter_result)
         fb["recommendations"] = _normalize_recommendations(fb.get("recommendations") or [])
-        return fb
\ No newline at end of file
+        return fb
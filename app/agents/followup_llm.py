@@ -1,10 +1,11 @@
 # app/agents/followup_llm.py
 from __future__ import annotations
 
-import json
+import orjson
 import re
-from typing import Dict, Any, Optional, List
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, Optional, List, Tuple
+from app.llm import get_llm, ainvoke_shared
+from app.cache import LRUCache
 
 # Canonical enums (internal only; never surface snake_case to users)
 INCENTIVE_TYPES = ["pre_sales", "csp_transaction"]
@@ -27,59 +28,97 @@ Output STRICT JSON: {"question":"<string>"} — nothing else.
 """
 
 # ---------------- humanization helpers ----------------
-_INCENTIVE_DISPLAY = {
-    "pre_sales": "pre-sales",
-    "csp_transaction": "CSP transaction",
-}
-_SEGMENT_DISPLAY = {
-    "enterprise": "Enterprise",
-    "smec": "SMEC",
+# (field_name, canonical value) -> display text; one lookup instead of per-field branching
+_FIELD_DISPLAY: Dict[Tuple[str, str], str] = {
+    ("incentive_type", "pre_sales"): "pre-sales",
+    ("incentive_type", "csp_transaction"): "CSP transaction",
+    ("segment", "enterprise"): "Enterprise",
+    ("segment", "smec"): "SMEC",
 }
 
 # As a final safety net, replace any stray canonical tokens in model output
 _DECANON_REPLACEMENTS = [
-    (r"\bpre_sales\b", "pre-sales"),
-    (r"\bcsp_transaction\b", "CSP transaction"),
-    (r"\bsmec\b", "SMEC"),
+    ("pre_sales", "pre-sales"),
+    ("csp_transaction", "CSP transaction"),
+    ("smec", "SMEC"),
+]
+
+# Precompiled once (post-processing runs on every generated question); each pattern keeps
+# its literal token so a plain substring test can skip it on the common clean output.
+_DECANON_PATTERNS = [
+    (tok, re.compile(rf"\b{tok}\b", re.IGNORECASE), r) for tok, r in _DECANON_REPLACEMENTS
 ]
+_SNAKE_RE = re.compile(r"\b[a-z]+_[a-z_]+\b")
+_PROMISE_PREFIX_RE = re.compile(r"^\s*(?:i(?:\s+can|(?:'|’)ll)\s+)+", re.IGNORECASE)
+_CAN_YOU_RE = re.compile(r"^can you ", re.IGNORECASE)
 
 def _humanize_value(field_name: str, v: str) -> str:
     if not isinstance(v, str):
         return str(v)
     val = v.strip()
+    shown = _FIELD_DISPLAY.get((field_name, val))
+    if shown is not None:
+        return shown
     if field_name == "incentive_type":
-        return _INCENTIVE_DISPLAY.get(val, val.replace("_", " "))
+        return val.replace("_", " ")
     if field_name == "segment":
-        return _SEGMENT_DISPLAY.get(val, val.capitalize() if val.islower() else val)
+        return val.capitalize() if val.islower() else val
     # For other fields (workload, name, country), keep as-is
     return val
 
 def _humanize_list(field_name: str, vals: List[str]) -> List[str]:
     return [_humanize_value(field_name, x) for x in (vals or []) if isinstance(x, str) and x.strip()]
 
+# Fixed enums: humanized once at import (treat as read-only)
+_HUMAN_INCENTIVE_TYPES = _humanize_list("incentive_type", INCENTIVE_TYPES)
+_HUMAN_SEGMENTS = _humanize_list("segment", SEGMENTS)
+
+def _snake_to_words(m):
+    token = m.group(0)
+    # don't touch things that already got mapped above
+    if token.lower() in {"pre_sales", "csp_transaction"}:
+        return token
+    return token.replace("_", " ")
+
 def _decanonicalize_text(txt: str) -> str:
     out = txt
-    for pat, repl in _DECANON_REPLACEMENTS:
-        out = re.sub(pat, repl, out, flags=re.IGNORECASE)
+    low = out.lower()
+    for probe, pat, repl in _DECANON_PATTERNS:
+        if probe in low:
+            out = pat.sub(repl, out)
     # Also convert any remaining snake_case-ish token heuristically
     # (only when it's a single token like foo_bar)
-    def _snake_to_words(m):
-        token = m.group(0)
-        # don't touch things that already got mapped above
-        if token.lower() in {"pre_sales", "csp_transaction"}:
-            return token
-        return token.replace("_", " ")
-    out = re.sub(r"\b[a-z]+_[a-z_]+\b", _snake_to_words, out)
+    if "_" in out:
+        out = _SNAKE_RE.sub(_snake_to_words, out)
     return out
 
+# ---------------- static first-ask questions ----------------
+# First ask for a field with nothing to suggest: the LLM would only paraphrase these.
+_STATIC_QUESTIONS: Dict[str, str] = {
+    "name": "Which engagement name do you have in mind?",
+    "workload": "Which workload is this for?",
+    "incentive_type": "Is this a pre-sales or CSP transaction incentive?",
+    "country": "Which country is the customer in?",
+    "acv": "What is the deal's ACV?",
+    "hours": "How many workshop hours are planned?",
+}
+# hint keys that only restate the field itself (static enums)
+_STATIC_HINT_KEYS = {"allowed_values"}
+
+_QUESTION_COUNTS = {"static": 0, "llm": 0}
+
+def question_stats() -> Dict[str, Any]:
+    """Template vs. LLM follow-up counts and hints-cache counters (per worker)."""
+    return {**_QUESTION_COUNTS, "hints_cache": _HINTS_CACHE.info()}
+
 # ---------------- core prompt helpers ----------------
 def _build_hints(field_name: str, session: Dict[str, Any], options: Optional[List[str]]) -> Dict[str, Any]:
     hints: Dict[str, Any] = {}
 
     if field_name == "incentive_type":
-        hints["allowed_values"] = _humanize_list(field_name, INCENTIVE_TYPES)
+        hints["allowed_values"] = _HUMAN_INCENTIVE_TYPES
     elif field_name == "segment":
-        hints["allowed_values"] = _humanize_list(field_name, SEGMENTS)
+        hints["allowed_values"] = _HUMAN_SEGMENTS
 
     # candidates persisted by caller
     cands = (session.get("candidates") or {}).get(field_name) or []
@@ -99,6 +138,21 @@ def _build_hints(field_name: str, session: Dict[str, Any], options: Optional[Lis
 
     return hints
 
+# Hints only change when the API bumps session["_version"] (required_fields/candidates/
+# followup edits), so (session, version, field, options) identifies them; treat as read-only.
+_HINTS_CACHE = LRUCache(maxsize=256, ttl=1800)
+
+def _hints_for(field_name: str, session: Dict[str, Any], options: Optional[List[str]]) -> Dict[str, Any]:
+    sid = session.get("session_id")
+    if not sid:
+        return _build_hints(field_name, session, options)
+    key = (sid, session.get("_version", 0), field_name, tuple(options) if options else None)
+    hints = _HINTS_CACHE.get(key)
+    if hints is None:
+        hints = _build_hints(field_name, session, options)
+        _HINTS_CACHE.set(key, hints)
+    return hints
+
 def _postprocess(q: Optional[str], last_question_text: Optional[str]) -> str:
     """Ensure final formatting, humanize any canonical tokens, and avoid trivial repetition."""
     if not isinstance(q, str) or not q.strip():
@@ -115,13 +169,12 @@ def _postprocess(q: Optional[str], last_question_text: Optional[str]) -> str:
         txt += "?"
 
     # Kill "I can" / "I'll" phrasing if any
-    txt = re.sub(r"^\s*i\s+can\s+", "", txt, flags=re.IGNORECASE)
-    txt = re.sub(r"^\s*i(?:'|’)ll\s+", "", txt, flags=re.IGNORECASE)
+    txt = _PROMISE_PREFIX_RE.sub("", txt)
 
     # Avoid repeating exact previous question
     if last_question_text and txt.strip().lower() == last_question_text.strip().lower():
         if txt.lower().startswith("can you "):
-            txt = re.sub(r"^can you ", "Could you ", txt, flags=re.IGNORECASE)
+            txt = _CAN_YOU_RE.sub("Could you ", txt)
         else:
             txt = "Could you " + txt[0].lower() + txt[1:]
         if not txt.endswith("?"):
@@ -137,13 +190,24 @@ def _postprocess(q: Optional[str], last_question_text: Optional[str]) -> str:
 
     return txt
 
-def generate_followup_question(field_name: str,
-                               intent: Dict[str, Any],
-                               session: Dict[str, Any],
-                               *,
-                               attempt_count: int = 1,
-                               last_question_text: Optional[str] = None,
-                               options: Optional[List[str]] = None) -> str:
+def question_context(field_name: str,
+                     intent: Dict[str, Any],
+                     session: Dict[str, Any],
+                     options: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Session-derived part of the prompt context; equal contexts ask the same question."""
+    return {
+        "FIELD_NAME": field_name,
+        "INTENT_TOPIC": (intent or {}).get("topic"),
+        "HINTS": _hints_for(field_name, session, options),
+    }
+
+async def generate_followup_question(field_name: str,
+                                     intent: Dict[str, Any],
+                                     session: Dict[str, Any],
+                                     *,
+                                     attempt_count: int = 1,
+                                     last_question_text: Optional[str] = None,
+                                     options: Optional[List[str]] = None) -> str:
     """
     field_name: e.g., "incentive_type", "workload", "country", "segment", "name"
     intent:    s["last_intent"] (same object you already store)
@@ -153,24 +217,25 @@ def generate_followup_question(field_name: str,
     options: optional explicit suggestions to embed briefly
     Returns:   the question string; falls back to a minimal prompt if parsing fails.
     """
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    ctx = question_context(field_name, intent, session, options)
+    static_q = _STATIC_QUESTIONS.get(field_name)
+    if static_q and attempt_count == 1 and _STATIC_HINT_KEYS.issuperset(ctx["HINTS"]):
+        _QUESTION_COUNTS["static"] += 1
+        return _postprocess(static_q, last_question_text)
 
-    ctx = {
-        "FIELD_NAME": field_name,
-        "INTENT_TOPIC": (intent or {}).get("topic"),
-        "ATTEMPT_COUNT": attempt_count,
-        "LAST_QUESTION_TEXT": (last_question_text or ""),
-        "HINTS": _build_hints(field_name, session, options),
-    }
+    _QUESTION_COUNTS["llm"] += 1
+    llm = get_llm(max_tokens=80, json_mode=True)  # {"question": "<= 15 words"}
+    ctx["ATTEMPT_COUNT"] = attempt_count
+    ctx["LAST_QUESTION_TEXT"] = last_question_text or ""
 
     msgs = [
         {"role": "system", "content": SYSTEM},
-        {"role": "user", "content": "JSON_CONTEXT=\n" + json.dumps(ctx, ensure_ascii=False)},
+        {"role": "user", "content": "JSON_CONTEXT=\n" + orjson.dumps(ctx).decode()},
     ]
 
     try:
-        resp = llm.invoke(msgs).content
-        data = json.loads(resp)  # expect {"question": "..."}
+        resp = (await ainvoke_shared(llm, msgs)).content
+        data = orjson.loads(resp)  # expect {"question": "..."}
         q = _postprocess((data or {}).get("question"), last_question_text)
         if q:
             return q
@@ -1,6 +1,10 @@
-import json
-from langchain_openai import ChatOpenAI
+import orjson
+import re
+from typing import Optional
+from app.llm import get_llm, ainvoke_shared
 from app.intent_catalog import INTENTS
+from app.cache import LRUCache
+from app.synonyms import clean
 
 SYSTEM = """
 You are an intent detector for BizApps incentives.
@@ -49,21 +53,118 @@ RULES:
 Return ONLY the JSON object. No extra text.
 """
 
-INTENT_NAMES = { item["topic"] for item in INTENTS }
+_INTENT_BY_TOPIC = { item["topic"]: item for item in INTENTS }
+INTENT_NAMES = _INTENT_BY_TOPIC.keys()
 
-def detect_intent(user_text: str) -> dict:
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+# Static system prompt, built once: byte-identical on every call so OpenAI's
+# automatic prompt caching can reuse the prefix. Per-turn data goes in the user message.
+_INTENTS_JSON = orjson.dumps(list(_INTENT_BY_TOPIC)).decode()
+SYSTEM_FULL = SYSTEM + "\nINTENTS:\n" + _INTENTS_JSON
+
+# Exact-match cache: normalized user text -> topic (rehydrated from the catalog on hit)
+_TOPIC_CACHE = LRUCache(maxsize=2048, ttl=3600)
+
+def cache_info() -> dict:
+    return _TOPIC_CACHE.info()
+
+# ---------------- Rule fast path ----------------
+# Rules A–G of SYSTEM as compiled regexes; only unambiguous matches skip the LLM.
+_CALC_RE = re.compile(r"\b(calculate|calc|compute|estimate|how much will we earn)\b", re.I)
+_WORKSHOP_RE = re.compile(r"\b(workshops?|immersions?)\b", re.I)
+_BRIEFING_RE = re.compile(r"\b(briefings?|envisioning)\b", re.I)
+# Calculator inputs: a quantity attached to its unit ("8 hours", "7.5h", "ACV 250k", "$120,000 ACV").
+# Digits inside a word ("D365") don't count, nor do "min/minimum hours" (an activity requirement).
+_HOURS_INPUT_RE = re.compile(
+    r"(?<!\bmin )(?<!\bmin\. )(?<!\bminimum )(?<![\w.])\d[\d,.]*\s*(hours?|hrs?|h)\b", re.I
+)
+_ACV_INPUT_RE = re.compile(
+    r"\bacv\b\s*(?:of|is|=|:|at|~)?\s*[$€£₹]?\s*\d"
+    r"|(?<![\w.])[$€£₹]?\s*\d[\d,.]*\s*(?:k|m|mm)?\s*(?:in\s+)?acv\b",
+    re.I,
+)
+_PAYOUT_RE = re.compile(
+    r"(\bhow much\b|\brates?\b|\bmarket [abc]\b|\bcaps?\b|\bmaximum\b|\bpayouts?\b|\bpercentage\b|%)", re.I
+)
+_REQUIREMENT_RE = re.compile(
+    r"\b(requirements?|required|activities|activity|scope|deliverables?|min(imum)? hours)\b", re.I
+)
+_ELIGIBLE_RE = re.compile(r"\b(eligible|eligibility|qualify|qualifies|qualified|qualification)\b", re.I)
+_PARTNER_RE = re.compile(
+    r"\b(we|us|our company|partners?|designation|specialization|solution partner)\b", re.I
+)
+_PARTNER_STATUS_RE = re.compile(r"\b(designation|specialization|solution partner)\b", re.I)
+_CUSTOMER_RE = re.compile(r"\b(customers?|clients?|tenants?|end customer)\b", re.I)
+_RECOMMEND_RE = re.compile(
+    r"\b(recommend\w*|which (program|engagement|incentive)s?|what should (we|i) (do|run|pick|offer))\b", re.I
+)
+
+def detect_intent_fast(text: str) -> Optional[str]:
+    """Apply rules A–G in priority order; None when the text is ambiguous or unmatched."""
+    t = text or ""
+    calc = bool(_CALC_RE.search(t))
+    # numeric inputs: hours/acv with an actual quantity (not "min hours?", not the 365 in D365)
+    calc_inputs = bool(_HOURS_INPUT_RE.search(t) or _ACV_INPUT_RE.search(t))
+    workshop = bool(_WORKSHOP_RE.search(t))
+    briefing = bool(_BRIEFING_RE.search(t))
+
+    # A/B: only an explicit calc ask decides here; bare numbers are left to the LLM (rule 5)
+    if calc:
+        if calc_inputs:
+            return "calc_presales_workshop_payout"  # briefing calc takes no hours/acv
+        if workshop and briefing:
+            return None  # e.g. "Envisioning Workshop": artifact is ambiguous
+        if workshop:
+            return "calc_presales_workshop_payout"
+        if briefing:
+            return "calc_presales_briefing_payout"
+        return None
+    if calc_inputs:
+        return None  # "250k ACV ... eligible?": maybe calc, maybe not
+
+    payout = bool(_PAYOUT_RE.search(t))
+    requirement = bool(_REQUIREMENT_RE.search(t))
+    eligible = bool(_ELIGIBLE_RE.search(t))
+    partner = bool(_PARTNER_STATUS_RE.search(t)) or (eligible and bool(_PARTNER_RE.search(t)))
+    customer = eligible and bool(_CUSTOMER_RE.search(t))
+
+    if payout or requirement:
+        if partner or customer or eligible:
+            return None  # payout vs eligibility has no stated tie-break
+        return "earning_amount" if payout else "activity_requirement"
+    if partner:
+        return "partner_qualification"  # also wins when the customer is mentioned
+    if customer:
+        return "customer_qualification"
+    if eligible:
+        return None  # eligibility of whom?
+    if _RECOMMEND_RE.search(t):
+        return "recommend_engagement"
+    return None
+
+async def detect_intent(user_text: str) -> dict:
+    topic = detect_intent_fast(user_text)
+    if topic in INTENT_NAMES:
+        return {"topic": topic, "intent": _INTENT_BY_TOPIC[topic]}
+
+    key = clean(user_text)
+    topic = _TOPIC_CACHE.get(key) if key else None
+    if topic:
+        return {"topic": topic, "intent": _INTENT_BY_TOPIC[topic]}
+
+    llm = get_llm(max_tokens=24, json_mode=True)  # {"topic": "..."}
     msgs = [
-        {"role":"system","content": SYSTEM + "\nINTENTS:\n" + json.dumps([i["topic"] for i in INTENTS], ensure_ascii=False)},
+        {"role":"system","content": SYSTEM_FULL},
         {"role":"user","content": user_text},
     ]
-    resp = llm.invoke(msgs).content
+    resp = (await ainvoke_shared(llm, msgs)).content
     try:
-        data = json.loads(resp)  # expect {"topic": "..."}
+        data = orjson.loads(resp)  # expect {"topic": "..."}
         topic = (data or {}).get("topic")
         if topic in INTENT_NAMES:
             # return the full object from catalog
-            full = next(x for x in INTENTS if x["topic"] == topic)
+            full = _INTENT_BY_TOPIC[topic]
+            if key:
+                _TOPIC_CACHE.set(key, topic)
             return {"topic": topic, "intent": full}
     except Exception:
         pass
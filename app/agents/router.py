@@ -1,32 +1,35 @@
 # app/agents/router.py
 from __future__ import annotations
-import json
+import logging
+import orjson
 from typing import Any, Dict, Literal, List, Optional
-from langchain_openai import ChatOpenAI
+from app.llm import get_llm, ainvoke_shared
+from app.cache import LRUCache
+from app.synonyms import clean
 import re  # <-- add
 
 Route = Literal["incentive_lookup", "doc_qa"]
 
+logger = logging.getLogger(__name__)
+
 # -------------------------
 # Conversation summarizers
 # -------------------------
 def _tail_messages(session: Optional[Dict[str, Any]], n: int = 6) -> List[Dict[str, str]]:
-    msgs = (session or {}).get("messages") or []
-    tail = msgs[-n:]
-    out: List[Dict[str, str]] = []
-    for m in tail:
-        role = (m.get("role") or "user").strip()
-        text = (m.get("text") or "").strip().replace("\n", " ")
-        if len(text) > 280:
-            text = text[:277] + "..."
-        out.append({
-            "role": role,
-            "text": text,
-            "field": (m.get("field_name") or "")[:64],
-        })
-    return out
-
-def _summarize_session(session: Optional[Dict[str, Any]]) -> str:
+    # messages are stored compact (see session.compact_message), so a slice is enough
+    return ((session or {}).get("messages") or [])[-n:]
+
+def _previous_user_text(session: Optional[Dict[str, Any]], max_chars: int = 280) -> str:
+    tail = _tail_messages(session, n=6)
+    if tail and tail[-1].get("role") == "user":
+        tail = tail[:-1]  # the turn's own message is already appended by the API
+    for m in reversed(tail):
+        if m.get("role") == "user":
+            text = m.get("text") or ""
+            return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+    return ""
+
+def _summarize_session(session: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     s = session or {}
     last_path = s.get("last_path") or ""
     last_intent = ((s.get("last_intent") or {}).get("intent") or {})
@@ -37,7 +40,6 @@ def _summarize_session(session: Optional[Dict[str, Any]]) -> str:
     followup = (s.get("followup") or {}).get("field_name") or ""
     have_docs = bool(s.get("last_docs"))
     have_rows = bool(s.get("last_result"))
-    tail = _tail_messages(s, n=6)
 
     summary = {
         "last_path": last_path,
@@ -47,9 +49,10 @@ def _summarize_session(session: Optional[Dict[str, Any]]) -> str:
         "pending_followup_field": followup,
         "have_docs_context": have_docs,
         "have_table_rows": have_rows,
-        "recent_messages": tail,
+        "message_count": len(s.get("messages") or []),
+        "previous_user_message": _previous_user_text(s),
     }
-    return json.dumps(summary, ensure_ascii=False)
+    return summary  # nested as-is in the router payload, serialized once there
 
 # -------------------------
 # Deterministic data guard (pre-LLM)
@@ -92,6 +95,39 @@ def _data_guard_route(user_message: str, session: Optional[Dict[str, Any]]) -> O
 
     return None  # let LLM decide
 
+# -------------------------
+# Keyword fast path (pre-LLM)
+# -------------------------
+# Decisive CONTEXT RULES from the router prompt, applied on word tokens.
+_DOC_QA_KEYWORDS = {
+    "poe", "template", "templates", "deliverable", "deliverables", "evidence", "submit",
+    "sla", "tat", "approval", "approvals", "exception", "exceptions",
+    # process/docs vocabulary; keeps the incentive-only rule from swallowing these
+    "guide", "guides", "process", "policy", "policies", "documentation", "mci",
+}
+_INCENTIVE_KEYWORDS = {"payout", "payouts", "rate", "rates", "cap", "caps", "market", "eligibility", "segment", "csp"}
+_WORD_RX = re.compile(r"[a-z0-9]+")
+
+def _fast_route(user_message: str, session: Optional[Dict[str, Any]],
+                pending_field: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    words = _WORD_RX.findall((user_message or "").lower())
+    doc_hits = _DOC_QA_KEYWORDS.intersection(words)
+
+    if doc_hits and len(words) <= 2:
+        return {"route": "doc_qa", "by": "rule",
+                "scores": {"confidence": 0.85, "why": f"Short doc-QA message ({', '.join(sorted(doc_hits))})"}}
+    if doc_hits:
+        return None  # mixed or doc-heavy message -> LLM weighs it
+
+    pending = ((session or {}).get("followup") or {}).get("field_name") or pending_field or ""
+    if pending:
+        return {"route": "incentive_lookup", "by": "rule",
+                "scores": {"confidence": 0.85, "why": f"Answering pending follow-up '{pending}'"}}
+    if _INCENTIVE_KEYWORDS.intersection(words):
+        return {"route": "incentive_lookup", "by": "rule",
+                "scores": {"confidence": 0.8, "why": "Payout/eligibility terms without doc-QA terms"}}
+    return None
+
 # -------------------------
 # LLM-only Router (context-aware)
 # -------------------------
@@ -112,48 +148,50 @@ CONTEXT RULES
 - Be decisive. Do NOT ask clarifying questions.
 
 OUTPUT (STRICT JSON ONLY)
-{"route":"incentive_lookup"|"doc_qa","why":"<≤1 sentence>","confidence":0.0-1.0}
+{"route":"incentive_lookup"|"doc_qa","confidence":0.0-1.0,"why":"<≤1 sentence>"}
 
 EXAMPLES
 Q: "What POE items are required for pre-sales workshops?"
-A: {"route":"doc_qa","why":"POE items + required = documentation/deliverables","confidence":0.91}
+A: {"route":"doc_qa","confidence":0.91,"why":"POE items + required = documentation/deliverables"}
 
 Q: "What’s the payout rate for the Envisioning workshop in Market B?"
-A: {"route":"incentive_lookup","why":"Asks payout rate for a workshop by market","confidence":0.94}
+A: {"route":"incentive_lookup","confidence":0.94,"why":"Asks payout rate for a workshop by market"}
 
 Q: "Are we eligible for assessment funding?"
-A: {"route":"incentive_lookup","why":"Eligibility for funding","confidence":0.90}
+A: {"route":"incentive_lookup","confidence":0.90,"why":"Eligibility for funding"}
 
 Q: "Where do I submit the POE template?"
-A: {"route":"doc_qa","why":"Submission + POE template = process/docs","confidence":0.93}
+A: {"route":"doc_qa","confidence":0.93,"why":"Submission + POE template = process/docs"}
 
 Q: "presales workshop requirements"
-A: {"route":"doc_qa","why":"'requirements' here implies deliverables/process, not payout","confidence":0.70}
+A: {"route":"doc_qa","confidence":0.70,"why":"'requirements' here implies deliverables/process, not payout"}
 
 Q: "cap and % for SME segment"
-A: {"route":"incentive_lookup","why":"Cap and percent are payout terms","confidence":0.88}
+A: {"route":"incentive_lookup","confidence":0.88,"why":"Cap and percent are payout terms"}
 
 Q: "POE"
-A: {"route":"doc_qa","why":"Single-word POE implies documentation context","confidence":0.85}
+A: {"route":"doc_qa","confidence":0.85,"why":"Single-word POE implies documentation context"}
 """
 
-def _llm_route(user_message: str, session: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+async def _llm_route(user_message: str, session: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    llm = get_llm(max_tokens=96, json_mode=True)  # route + confidence first, then a one-sentence why
     payload = {
         "NEW_USER_MESSAGE": user_message,
         "CONVERSATION_CONTEXT": _summarize_session(session)
     }
-    resp = llm.invoke([
+    resp = (await ainvoke_shared(llm, [
         {"role": "system", "content": _ROUTER_SYSTEM},
-        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
-    ]).content
+        {"role": "user", "content": orjson.dumps(payload).decode()}
+    ])).content
 
-    # Strict parse; salvage JSON if wrapped
+    # JSON mode guarantees a bare object; anything else defaults below (no salvage scan)
     try:
-        data = json.loads(resp)
-    except Exception:
-        start, end = resp.find("{"), resp.rfind("}")
-        data = json.loads(resp[start:end+1]) if start != -1 and end != -1 else {}
+        data = orjson.loads(resp)
+    except orjson.JSONDecodeError:
+        logger.warning("router: unparseable LLM reply, defaulting route: %.200r", resp)
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
 
     route = data.get("route")
     why = data.get("why", "")
@@ -170,16 +208,62 @@ def _llm_route(user_message: str, session: Optional[Dict[str, Any]]) -> Dict[str
 
     return {"route": route, "by": "llm", "scores": {"confidence": conf, "why": why}}
 
+# -------------------------
+# Decision cache (LLM routes only)
+# -------------------------
+# Keyed on the normalized message plus the context the CONTEXT RULES depend on.
+_ROUTE_CACHE = LRUCache(maxsize=2048, ttl=3600)
+
+def _route_cache_key(user_message: str, session: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    msg = clean(user_message)
+    if not msg:
+        return None
+    s = session or {}
+    return (
+        msg,
+        s.get("last_path") or "",
+        (s.get("followup") or {}).get("field_name") or "",
+        bool(s.get("last_result")),
+    )
+
+# How each turn was routed (per worker); guard/rule/cache turns skipped the LLM
+_ROUTE_COUNTS = {"guard": 0, "rule": 0, "cache": 0, "llm": 0}
+
+def cache_info() -> Dict[str, Any]:
+    return {**_ROUTE_CACHE.info(), "by": dict(_ROUTE_COUNTS)}
+
 # -------------------------
 # Public API
 # -------------------------
-def route_message(user_message: str, session: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+async def route_message(user_message: str,
+                        session: Optional[Dict[str, Any]] = None,
+                        *,
+                        pending_field: Optional[str] = None) -> Dict[str, Any]:
     """
     Decide route for this turn.
     1) Deterministic data-guard
-    2) Otherwise LLM router
+    2) Keyword fast path (pending_field: field a follow-up turn answers, if the session has none pending)
+    3) Cached LLM decision for the same message + context
+    4) Otherwise LLM router
     """
     guard = _data_guard_route(user_message, session)
     if guard:
+        _ROUTE_COUNTS["guard"] += 1
         return guard
-    return _llm_route(user_message, session)
+
+    fast = _fast_route(user_message, session, pending_field)
+    if fast:
+        _ROUTE_COUNTS["rule"] += 1
+        return fast
+
+    key = _route_cache_key(user_message, session)
+    hit = _ROUTE_CACHE.get(key) if key else None
+    if hit:
+        _ROUTE_COUNTS["cache"] += 1
+        return {**hit, "by": "cache"}
+
+    _ROUTE_COUNTS["llm"] += 1
+    decision = await _llm_route(user_message, session)
+    if key and decision["scores"]["confidence"]:  # don't pin defaulted (unparseable/invalid) replies
+        _ROUTE_CACHE.set(key, decision)
+    return decision
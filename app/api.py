@@ -1,19 +1,29 @@
 # app/api.py
 
-from fastapi import APIRouter
+import asyncio
+import copy
+import sys
+from itertools import chain
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Mapping, Callable, Awaitable
 import uuid
-from app.agents.router import route_message
+from app.agents.router import route_message, cache_info as router_cache_info
 from app.agents.docqa_agent import docqa_turn as _docqa_turn
 from app.agents.final_answer_agent import generate_final_answer
 from app.agents.continuation_agent import detect_continuation  # continuation check
 from app.session import get_session, create_session, save_session, add_message
 from app.graph import app_graph
-from app.agents.field_validator_v1 import field_validator_v1
-from app.agents.followup_llm import generate_followup_question
+from app.intent_catalog import INTENTS_COMPILED, compile_intent
+from app.agents.field_validator_v1 import field_validator_v1, load_catalog, catalog_ready
+from app.agents.followup_llm import generate_followup_question, question_context, question_stats
+from app.agents.intent_detector import cache_info as intent_cache_info
+from app.cache import LRUCache
+from app.llm import coalesce_stats
 from app.agents.field_value_resolver import resolve_field_from_message
 from app.agents.db_filter_service import filter_incentives
+from app.db import request_connection, release_connection
 
 router = APIRouter()
 
@@ -27,11 +37,10 @@ class TurnInput(BaseModel):
 
 # ---------------- helpers ----------------
 def _list_or_none(v):
+    """required_fields value shape: None or a list; str values are interned (they repeat across sessions)."""
     if v is None:
         return None
-    if isinstance(v, list):
-        return v
-    return [v]
+    return [sys.intern(x) if type(x) is str else x for x in (v if isinstance(v, list) else [v])]
 
 def _merge_required_fields(old: Dict[str, Optional[List[str]]],
                            new: Dict[str, Optional[List[str]]]) -> Dict[str, Optional[List[str]]]:
@@ -44,38 +53,83 @@ def _merge_required_fields(old: Dict[str, Optional[List[str]]],
             out.setdefault(k, None)
     return out
 
-def _trailing_from_rule(req_expr: List[str]) -> List[str]:
-    return [e.strip() for e in (req_expr[1:] if isinstance(req_expr, list) else []) if isinstance(e, str) and e.strip()]
+def _rule_for(session: Dict[str, Any]) -> Mapping[str, Any]:
+    """Compiled required-field rule of the session's intent (parsed once in intent_catalog)."""
+    last = session.get("last_intent") or {}
+    rule = INTENTS_COMPILED.get(last.get("topic"))
+    if rule is None:  # intent object not in the current catalog (e.g. an older session)
+        rule = compile_intent(last.get("intent") or {})
+    return rule
+
+def _trailing_from_rule(rule: Mapping[str, Any]) -> List[str]:
+    return list(rule["trailing"])
 
 def _is_bad(v) -> bool:
-    return (v is None) or (isinstance(v, list) and len(v) != 1)
+    # exact-type check: values come from JSON/our own code, never list subclasses
+    return v is None or (type(v) is list and len(v) != 1)
 
-def _next_missing_field(session: Dict[str, Any], req_expr: List[str]) -> Optional[str]:
-    order = list(session.get("picked_set", [])) + _trailing_from_rule(req_expr)
+def _derive_missing_queue(session: Dict[str, Any], rule: Mapping[str, Any]) -> List[str]:
+    """(Re)build session['_missing_queue']: unfilled fields in ask order (picked_set, rule tail, rest)."""
+    rf = session.get("required_fields") or {}
+    order = dict.fromkeys(chain(session.get("picked_set") or (), rule["trailing"], rf))  # ordered, deduped
+    queue = [f for f in order if _is_bad(rf.get(f))]
+    session["_missing_queue"] = queue
+    return queue
+
+def _mark_filled(session: Dict[str, Any], field: str) -> None:
+    queue = session.get("_missing_queue")
+    if queue and field in queue:
+        queue.remove(field)
+
+def _next_missing_field(session: Dict[str, Any], rule: Mapping[str, Any]) -> Optional[str]:
+    queue = session.get("_missing_queue")
+    if queue is None:
+        queue = _derive_missing_queue(session, rule)
+    # drop heads that were filled outside _mark_filled (cheap; normally a no-op)
     rf = session.get("required_fields") or {}
-    for f in order:
-        if _is_bad(rf.get(f)):
-            return f
-    for f in rf.keys():
-        if _is_bad(rf.get(f)):
-            return f
-    return None
-
-def _run_db_filter_and_save(session_id: str, s: Dict[str, Any], *, limit: int = 25, offset: int = 0):
-    """Run DB filter by current required_fields and store rows in session['last_result']."""
+    while queue and not _is_bad(rf.get(queue[0])):
+        queue.pop(0)
+    return queue[0] if queue else None
+
+async def _task_result(task: asyncio.Task, rerun: Callable[[], Awaitable[Any]]) -> Any:
+    """Result of a task started ahead of the router; re-run it if it was cancelled."""
+    if task.cancelled():
+        return await rerun()
+    return await task
+
+# (message, rule) -> field_validator_v1 result; expires so catalog changes are picked up
+_VALIDATE_CACHE = LRUCache(maxsize=512, ttl=3600)
+
+def _validate_fields(user_message: str, req_expr: List[str]) -> Dict[str, Any]:
+    """
+    field_validator_v1 memoized per (message, rule); callers get a private deep copy.
+    Not cached while the catalog is empty (DB down at startup), so those misses don't stick.
+    """
+    key = (user_message, tuple(req_expr))
+    result = _VALIDATE_CACHE.get(key)
+    if result is None:
+        result = field_validator_v1(user_message=user_message, required_fields=list(req_expr))
+        if catalog_ready():
+            _VALIDATE_CACHE.set(key, result)
+    return copy.deepcopy(result)
+
+async def _run_db_filter(s: Dict[str, Any], *, limit: int = 25) -> Dict[str, Any]:
+    """Run DB filter by current required_fields and store rows in s['last_result']."""
     rf: Dict[str, Optional[List[str]]] = s.get("required_fields") or {}
-    res = filter_incentives(rf, limit=limit, offset=offset)
+    try:
+        res = await filter_incentives(rf, limit=limit)
+    finally:
+        await release_connection()  # the final answer (LLM) runs next; don't hold the connection
     s["last_result"] = res.rows or []
-    save_session(session_id, s)
+    return s
 
-def _run_final_answer_and_save(session_id: str, s: Dict[str, Any], override_message: Optional[str] = None):
+async def _run_final_answer(s: Dict[str, Any], override_message: Optional[str] = None) -> Dict[str, Any]:
     """
-    Generate final answer from (message, required_fields, last_result). Save to session.
-    Only append the answer_text to messages. DO NOT append recommendations.
-    Also scrub any previously-added recommendation messages from history.
+    Generate final answer from (message, required_fields, last_result) into the in-memory session.
+    Only append the answer_text to messages. DO NOT append recommendations
+    (ones stored by older runs are scrubbed once when the session loads).
     """
-    s = get_session(session_id) or s
-    final = generate_final_answer(
+    final = await generate_final_answer(
         original_user_message=(
             override_message if override_message is not None
             else (s.get("original_user_message") or "")
@@ -84,31 +138,12 @@ def _run_final_answer_and_save(session_id: str, s: Dict[str, Any], override_mess
         filter_result=s.get("last_result") or [],
     )
     s["final_answer"] = final
-    save_session(session_id, s)
 
-    # 1) Append only the human-facing answer to messages.
+    # Append only the human-facing answer to messages.
     answer = final.get("answer_text")
     if isinstance(answer, str) and answer.strip():
-        add_message(session_id, "assistant", answer.strip(), field_name=None)
-
-    # 2) Ensure recommendations are NOT in chat history.
-    #    If any were added by older runs, remove them now.
-    recs = [r.strip() for r in (final.get("recommendations") or []) if isinstance(r, str) and r.strip()]
-    if recs:
-        s = get_session(session_id) or s
-        msgs = s.get("messages") or []
-        rec_set = set(recs)
-        filtered = [
-            m for m in msgs
-            if not (
-                m.get("role") == "assistant"
-                and isinstance(m.get("text"), str)
-                and m["text"].strip() in rec_set
-            )
-        ]
-        if len(filtered) != len(msgs):
-            s["messages"] = filtered
-            save_session(session_id, s)
+        add_message(s, "assistant", answer.strip(), field_name=None)
+    return s
 
 
 def _make_api_response(s: Dict[str, Any]) -> Dict[str, Any]:
@@ -160,57 +195,76 @@ def _set_active_question(s: Dict[str, Any], route: str, text: str) -> Dict[str,
 def _get_active_question(s: Dict[str, Any], route: str, fallback: str = "") -> str:
     return ((s.get("active_questions") or {}).get(route) or fallback or "").strip()
 
+def _bump_version(s: Dict[str, Any]) -> None:
+    """Mark required_fields/candidates/followup as changed (keys the follow-up hints cache)."""
+    s["_version"] = s.get("_version", 0) + 1
+
+
 
-# ---------------- route ----------------
-@router.post("/message")
-def turn(inp: TurnInput):
+# ---------------- routes ----------------
+@router.get("/cache_info")
+def cache_info():
+    """Hit/miss counters of the in-process LLM decision caches, field validation, follow-up templates and shared LLM calls (per worker)."""
+    return {
+        "intent": intent_cache_info(),
+        "router": router_cache_info(),
+        "validate": _VALIDATE_CACHE.info(),
+        "followup": question_stats(),
+        "llm": coalesce_stats(),
+    }
+
+# LLM agents are awaited natively; the remaining blocking agents (doc-QA, continuation,
+# field resolution/validation) run in the threadpool to keep the event loop free; DB reads are async.
+# The session is loaded once per turn, mutated in memory and written back once on return.
+@router.post("/message", dependencies=[Depends(request_connection)])
+async def turn(inp: TurnInput):
     # ---------------- Session bootstrap ----------------
     session_id = inp.session_id
-    s = get_session(session_id) if session_id else None
+    s = await get_session(session_id) if session_id else None
     if not s:
         session_id = str(uuid.uuid4())
         s = create_session(session_id, inp.user_message)
-        save_session(session_id, s)
 
     # ---------------- Helper locals ----------------
-    def _append_user_message():
-        add_message(session_id, "user", inp.user_message, _pick_field_name(inp))
+    async def _respond(state: Dict[str, Any]) -> Dict[str, Any]:
+        # every turn appends the user message, so the session is always dirty here;
+        # end-of-turn followup edits also invalidate cached hints
+        _bump_version(state)
+        await save_session(session_id, state)
+        return _make_api_response(state)
 
     # ---------------- FOLLOW-UP TURN ----------------
     if _is_followup_turn(inp):
-        _append_user_message()
-        s = get_session(session_id) or s
+        add_message(s, "user", inp.user_message, _pick_field_name(inp))
 
         field = (_pick_field_name(inp) or "").strip()
         if not field:
             # nothing to resolve; return current state
-            s = get_session(session_id) or s
-            return _make_api_response(s)
+            return await _respond(s)
+
+        # Field resolution only needs the message, so it overlaps the router below;
+        # the result is dropped if the router escapes to doc_qa.
+        resolve_task = asyncio.create_task(resolve_field_from_message(field, inp.user_message))
 
         # ---- Doc-QA escape hatch on follow-up ----
         try:
-            _r = route_message(inp.user_message, s)
+            _r = await route_message(inp.user_message, s, pending_field=field)
             s["last_route_decision"] = _r
-            save_session(session_id, s)
-            s = get_session(session_id) or s
 
             if _r["route"] == "doc_qa":
                 s["followup"] = None
                 s = _set_active_question(s, "doc_qa", inp.user_message)
-                save_session(session_id, s)
-                s = get_session(session_id) or s
-
-                s = _docqa_turn(inp.user_message, s)
+                s = await run_in_threadpool(_docqa_turn, inp.user_message, s)
                 s["last_path"] = "doc_qa"
-                save_session(session_id, s)
-                s = get_session(session_id) or s
-                return _make_api_response(s)
+                out = await _respond(s)
+                resolve_task.cancel()  # only once doc_qa answered; a failure falls back below
+                return out
         except Exception:
-            # router failed -> continue with incentive field resolution
+            # router (or doc_qa) failed -> continue with incentive field resolution
             pass
 
         # ---- Resolve field from follow-up message ----
-        res = resolve_field_from_message(field, inp.user_message)
+        res = await _task_result(resolve_task, lambda: resolve_field_from_message(field, inp.user_message))
         value = res.get("value")
         cands = res.get("candidates") or []
         cand_vals = [c.get("value") for c in cands if isinstance(c, dict) and c.get("value")]
@@ -218,17 +272,18 @@ def turn(inp: TurnInput):
 
         if value is not None:
             rf: Dict[str, Optional[List[str]]] = s.get("required_fields") or {}
-            rf[field] = [value]
+            rf[field] = _list_or_none(value)
             s["required_fields"] = rf
             s["followup"] = None
-            save_session(session_id, s)
-            s = get_session(session_id) or s
+            _mark_filled(s, field)
+            _bump_version(s)
         else:
             s.setdefault("candidates", {}).setdefault(field, [])
             s["candidates"][field] = [{"value": v, "score": 92} for v in (top_opts or [])]
+            _bump_version(s)
             last_q = (s.get("followup") or {}).get("question")
             attempt = 1 + int((s.get("asked_log") or {}).get(field, 0))
-            q = generate_followup_question(
+            q = await generate_followup_question(
                 field_name=field,
                 intent=s.get("last_intent", {}),
                 session=s,
@@ -238,31 +293,20 @@ def turn(inp: TurnInput):
             )
             (s.setdefault("asked_log", {}))[field] = attempt
             s["followup"] = {"question": q, "field_name": field, "options": top_opts}
-            save_session(session_id, s)
-            add_message(session_id, "assistant", q, field)
-            s = get_session(session_id) or s
-            return _make_api_response(s)
+            add_message(s, "assistant", q, field)
+            return await _respond(s)
 
         # ---- Check next missing / finalize ----
-        intent_obj = (s.get("last_intent") or {}).get("intent") or {}
-        req_expr = intent_obj.get("required_fields") or []
-        missing = _next_missing_field(s, req_expr)
+        missing = _next_missing_field(s, _rule_for(s))
 
         if not missing:
             s["followup"] = None
-            save_session(session_id, s)
-            s = get_session(session_id) or s
-
-            _run_db_filter_and_save(session_id, s)
+            s = await _run_db_filter(s)
 
             incentive_q = _get_active_question(s, "incentive_lookup", inp.user_message)
-            _run_final_answer_and_save(session_id, s, override_message=incentive_q)
-
-            s = get_session(session_id) or s
+            s = await _run_final_answer(s, override_message=incentive_q)
             s["last_path"] = "incentive_lookup"
-            save_session(session_id, s)
-            s = get_session(session_id) or s
-            return _make_api_response(s)
+            return await _respond(s)
 
         # ask next missing
         options = None
@@ -270,124 +314,145 @@ def turn(inp: TurnInput):
             opts = [c.get("value") for c in (s["candidates"].get(missing) or []) if c.get("value")]
             options = opts or None
 
-        q = generate_followup_question(field_name=missing, intent=s.get("last_intent", {}), session=s)
+        q = await generate_followup_question(field_name=missing, intent=s.get("last_intent", {}), session=s)
         s["followup"] = {"question": q, "field_name": missing, "options": options}
-        save_session(session_id, s)
-        add_message(session_id, "assistant", q, missing)
-
-        s = get_session(session_id) or s
-        return _make_api_response(s)
+        add_message(s, "assistant", q, missing)
+        return await _respond(s)
 
     # ---------------- TEXT TURN ----------------
-    _append_user_message()
-    s = get_session(session_id) or s
+    add_message(s, "user", inp.user_message, _pick_field_name(inp))
+
+    # Intent detection only needs the user message, so it runs concurrently with the
+    # router (and continuation check) instead of after them; it is cancelled if the
+    # turn is answered by doc_qa or as a continuation.
+    intent_task = asyncio.create_task(
+        app_graph.ainvoke({"session_id": session_id, "text": inp.user_message})
+    )
+    # Likewise the continuation check, when there is a prior result to continue from.
+    cont_task = (
+        asyncio.create_task(detect_continuation(inp.user_message, s))
+        if s.get("last_result") or s.get("last_docs") else None
+    )
 
     # ---- Route FIRST (prevents continuation from stealing doc_qa turns) ----
     try:
-        r = route_message(inp.user_message, s)
+        r = await route_message(inp.user_message, s)
         s["last_route_decision"] = r
-        save_session(session_id, s)
-        s = get_session(session_id) or s
 
         # Remember the active question for chosen route
         s = _set_active_question(s, r["route"], inp.user_message)
-        save_session(session_id, s)
-        s = get_session(session_id) or s
 
         if r["route"] == "doc_qa":
-            s = _docqa_turn(inp.user_message, s)
+            s = await run_in_threadpool(_docqa_turn, inp.user_message, s)
             s["last_path"] = "doc_qa"
-            save_session(session_id, s)
-            s = get_session(session_id) or s
-            return _make_api_response(s)
+            out = await _respond(s)
+            # cancel only once doc_qa answered; a failure falls back to the incentive flow
+            intent_task.cancel()
+            if cont_task:
+                cont_task.cancel()
+            return out
         # else: incentive flow continues below
     except Exception:
-        # router failed -> treat as incentive flow
+        # router (or doc_qa) failed -> treat as incentive flow
         pass
 
     # ---- Continuation (only meaningful for incentive here) ----
-    if s.get("last_result") or s.get("last_docs"):
-        cont = detect_continuation(inp.user_message, s)
+    if cont_task:
+        cont = await _task_result(cont_task, lambda: detect_continuation(inp.user_message, s))
         if cont.get("is_continuation"):
             if s.get("last_path") == "doc_qa":
-                s = _docqa_turn(inp.user_message, s)
+                s = await run_in_threadpool(_docqa_turn, inp.user_message, s)
                 s["last_path"] = "doc_qa"
-                save_session(session_id, s)
-                s = get_session(session_id) or s
-                return _make_api_response(s)
-            # default: incentive continuation
-            incentive_q = _get_active_question(s, "incentive_lookup", inp.user_message)
-            _run_final_answer_and_save(session_id, s, override_message=incentive_q)
-            s = get_session(session_id) or s
-            s["last_path"] = "incentive_lookup"
-            save_session(session_id, s)
-            s = get_session(session_id) or s
-            return _make_api_response(s)
+            else:
+                # default: incentive continuation
+                incentive_q = _get_active_question(s, "incentive_lookup", inp.user_message)
+                s = await _run_final_answer(s, override_message=incentive_q)
+                s["last_path"] = "incentive_lookup"
+            out = await _respond(s)
+            intent_task.cancel()
+            return out
 
     # ---- Incentive fresh intent detection pipeline ----
-    result = app_graph.invoke({"session_id": session_id, "text": inp.user_message})
+    result = await _task_result(
+        intent_task, lambda: app_graph.ainvoke({"session_id": session_id, "text": inp.user_message})
+    )
 
-    s = get_session(session_id) or s
     s.setdefault("intent_topics", [])
+    prev_topic = (s.get("last_intent") or {}).get("topic")
     if result.get("intent"):
         s["last_intent"] = result["intent"]
         topic = result["intent"].get("topic")
         if topic and (not s["intent_topics"] or s["intent_topics"][-1] != topic):
             s["intent_topics"].append(topic)
-        save_session(session_id, s)
-        s = get_session(session_id) or s
 
     intent_obj = (s.get("last_intent") or {}).get("intent") or {}
     req_expr = intent_obj.get("required_fields") or []
+    rule = _rule_for(s)
+    if (s.get("last_intent") or {}).get("topic") != prev_topic:
+        _derive_missing_queue(s, rule)
+
+    # Speculatively ask for the field that is missing *before* validation while the
+    # validator runs; the question is kept only if validation leaves the same field
+    # missing with the same prompt context, otherwise it is cancelled.
+    spec_field = _next_missing_field(s, rule)
+    spec_ctx = spec_task = None
+    if spec_field:
+        spec_ctx = question_context(spec_field, s.get("last_intent", {}), s)
+        spec_task = asyncio.create_task(
+            generate_followup_question(field_name=spec_field, intent=s.get("last_intent", {}), session=s)
+        )
 
-    field_result = field_validator_v1(
-        user_message=inp.user_message,
-        required_fields=req_expr
-    )
+    try:
+        try:
+            await load_catalog()  # no-op once cached; the validator itself is DB-free
+        finally:
+            await release_connection()
+        field_result = await run_in_threadpool(_validate_fields, inp.user_message, req_expr)
+    except BaseException:
+        if spec_task:
+            spec_task.cancel()
+        raise
 
     new_rfo = field_result.get("required_fields_object", {})
     old_rfo = s.get("required_fields") or {}
     merged_rfo = _merge_required_fields(old_rfo, new_rfo)
 
     s["picked_set"] = field_result.get("picked_set", [])
-    s["required_fields"] = {k: _list_or_none(v) for k, v in merged_rfo.items()}
+    s["required_fields"] = merged_rfo  # values already normalized by the merge / earlier turns
     s["candidates"] = field_result.get("candidates", {})
-    save_session(session_id, s)
-    s = get_session(session_id) or s
+    _bump_version(s)
+    _derive_missing_queue(s, rule)
 
-    required_keys = list(s.get("picked_set", [])) + _trailing_from_rule(req_expr)
-    is_complete = required_keys and all(
-        isinstance(s["required_fields"].get(k), list) and len(s["required_fields"].get(k, [])) == 1
-        for k in required_keys
-    )
+    required_keys = list(s.get("picked_set", [])) + _trailing_from_rule(rule)
+    is_complete = required_keys and not any(_is_bad(merged_rfo.get(k)) for k in required_keys)
+
+    missing = None if is_complete else _next_missing_field(s, rule)
+    if spec_task and (
+        missing != spec_field
+        or question_context(missing, s.get("last_intent", {}), s) != spec_ctx
+    ):
+        spec_task.cancel()
+        spec_task = None
 
     if is_complete:
         s["followup"] = None
-        save_session(session_id, s)
-        s = get_session(session_id) or s
-
-        _run_db_filter_and_save(session_id, s)
+        s = await _run_db_filter(s)
 
         incentive_q = _get_active_question(s, "incentive_lookup", inp.user_message)
-        _run_final_answer_and_save(session_id, s, override_message=incentive_q)
-
-        s = get_session(session_id) or s
+        s = await _run_final_answer(s, override_message=incentive_q)
         s["last_path"] = "incentive_lookup"
-        save_session(session_id, s)
-        s = get_session(session_id) or s
-        return _make_api_response(s)
+        return await _respond(s)
 
     # ---- Ask next missing field ----
-    missing = _next_missing_field(s, req_expr)
     options = None
     if missing in (s.get("candidates") or {}):
         opts = [c.get("value") for c in (s["candidates"].get(missing) or []) if c.get("value")]
         options = opts or None
 
-    q = generate_followup_question(field_name=missing, intent=s.get("last_intent", {}), session=s)
+    if spec_task:
+        q = await spec_task
+    else:
+        q = await generate_followup_question(field_name=missing, intent=s.get("last_intent", {}), session=s)
     s["followup"] = {"question": q, "field_name": missing, "options": options}
-    save_session(session_id, s)
-    add_message(session_id, "assistant", q, missing)
-
-    s = get_session(session_id) or s
-    return _make_api_response(s)
+    add_message(s, "assistant", q, missing)
+    return await _respond(s)
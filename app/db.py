@@ -1,14 +1,68 @@
-from psycopg_pool import ConnectionPool
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 from .config import DATABASE_URL
 
-pool = ConnectionPool(DATABASE_URL, max_size=10, open=True) if DATABASE_URL else None
+# Opened/closed by the app lifespan (main.py); an async pool needs a running event loop.
+pool = AsyncConnectionPool(DATABASE_URL, max_size=10, open=False) if DATABASE_URL else None
 
-def qall(sql: str, params=()):
+# Per-request connection holder, bound by the request_connection dependency. The
+# connection is checked out lazily on the first query and reused until the caller ends the
+# DB phase with release_connection() (so it is never held across LLM calls); a later
+# query checks one out again. Whatever is still held is released when the request ends.
+_request_conn: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_conn", default=None)
+
+async def open_pool():
+    if pool: await pool.open()
+
+async def close_pool():
+    if pool: await pool.close()
+
+async def request_connection():
+    """FastAPI dependency: share one pooled connection across the queries of a DB phase."""
+    holder: Dict[str, Any] = {"lock": asyncio.Lock()}
+    _request_conn.set(holder)
+    try:
+        yield
+    finally:
+        _request_conn.set(None)  # not reset(token): teardown may run in a copied context
+        await _release(holder)
+
+async def _release(holder: Dict[str, Any]):
+    async with holder["lock"]:
+        cm = holder.pop("cm", None)
+        holder.pop("conn", None)
+        if cm is not None:
+            await cm.__aexit__(None, None, None)  # commits, then returns it to the pool
+
+async def release_connection():
+    """End the current DB phase: give the request's connection back to the pool (no-op if none)."""
+    holder = _request_conn.get()
+    if holder is not None:
+        await _release(holder)
+
+async def _held_connection(holder: Dict[str, Any]):
+    async with holder["lock"]:  # concurrent first queries must not check out twice
+        if "conn" not in holder:
+            cm = pool.connection()
+            holder["conn"] = await cm.__aenter__()
+            holder["cm"] = cm
+    return holder["conn"]
+
+async def qall(sql: str, params=()):
     if not pool: return []
-    with pool.connection() as conn, conn.cursor() as cur:
-        cur.execute(sql, params); cols = [c[0] for c in cur.description]
-        return [dict(zip(cols, r)) for r in cur.fetchall()]
+    holder = _request_conn.get()
+    if holder is None:
+        async with pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+    conn = await _held_connection(holder)
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(sql, params)
+        return await cur.fetchall()
 
-def qone(sql: str, params=()):
-    rows = qall(sql, params)
+async def qone(sql: str, params=()):
+    rows = await qall(sql, params)
     return rows[0] if rows else None
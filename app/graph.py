@@ -4,8 +4,8 @@ from .agents.intent_detector import detect_intent
 
 # state shape (keep minimal for now)
 # {"session_id": str, "text": str, "intent": dict}
-def _intent_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    intent = detect_intent(state["text"])
+async def _intent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    intent = await detect_intent(state["text"])
     return {**state, "intent": intent}
 
 
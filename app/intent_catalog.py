@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 INTENTS = [
   {
     "topic": "recommend_engagement",
@@ -58,3 +60,28 @@ INTENTS = [
     "answer_fields": ["activity_requirement","min_hours"]
   }
 ]
+
+# One entry per topic: a duplicate would silently shadow the other in every topic lookup
+assert len({i["topic"] for i in INTENTS}) == len(INTENTS), "duplicate topic in INTENTS"
+
+# ---------------- compiled form (parsed once at import) ----------------
+def _parse_alternatives(expr: str) -> tuple:
+    """'name | (workload,incentive_type)' -> (("name",), ("workload", "incentive_type"))"""
+    alts = []
+    for alt in expr.split("|"):
+        alt = alt.strip().strip("()")
+        fields = tuple(f.strip() for f in alt.split(",") if f.strip())
+        if fields:
+            alts.append(fields)
+    return tuple(alts)
+
+def compile_intent(item: dict) -> MappingProxyType:
+    req = [e.strip() for e in (item.get("required_fields") or []) if isinstance(e, str) and e.strip()]
+    return MappingProxyType({
+        "required_alts": _parse_alternatives(req[0]) if req else (),
+        "trailing": tuple(req[1:]),
+        "filter_fields": frozenset(item.get("filter_fields") or ()),
+        "answer_fields": tuple(item.get("answer_fields") or ()),
+    })
+
+INTENTS_COMPILED = MappingProxyType({i["topic"]: compile_intent(i) for i in INTENTS})
@@ -0,0 +1,76 @@
+# app/llm.py
+import asyncio
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from langchain_openai import ChatOpenAI
+
+
+@lru_cache(maxsize=16)
+def get_llm(model: str = "gpt-4o-mini",
+            temperature: float = 0,
+            *,
+            max_tokens: Optional[int] = None,
+            json_mode: bool = False) -> ChatOpenAI:
+    """
+    Shared ChatOpenAI per (model, temperature, max_tokens, json_mode).
+    Built once so every turn reuses the same client and its HTTP connection pool
+    (DNS/TLS only on first use, keep-alive afterwards).
+
+    json_mode: OpenAI JSON mode ({"type": "json_object"}); the prompt must mention JSON.
+    max_tokens: cap on completion tokens for small, fixed-shape outputs.
+    """
+    kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+    return ChatOpenAI(model=model, temperature=temperature, max_tokens=max_tokens, model_kwargs=kwargs)
+
+
+# ---------------- in-flight coalescing ----------------
+# Chat completions take one prompt per request, so there is no multi-prompt batch to
+# fill; what concurrent sessions do share is identical prompts (same cold cache key at
+# once, retries, double submits). Those ride on the single request already in flight.
+_INFLIGHT: Dict[tuple, "_Shared"] = {}
+_COALESCE_COUNTS = {"calls": 0, "coalesced": 0, "abandoned": 0}
+
+class _Shared:
+    """One in-flight call and how many callers are still waiting on it."""
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+def coalesce_stats() -> Dict[str, Any]:
+    """Shared-call counters (per worker); abandoned = calls cancelled after their last caller left."""
+    return {**_COALESCE_COUNTS, "in_flight": len(_INFLIGHT)}
+
+async def ainvoke_shared(llm: ChatOpenAI, msgs: List[Dict[str, str]]):
+    """
+    llm.ainvoke(msgs), joined with an identical call already in flight on the same client.
+    A cancelled caller doesn't cancel the call while others still wait on it; the last one
+    leaving cancels it (no billed completion nobody reads). Treat the result as read-only.
+    """
+    key = (id(llm), tuple((m["role"], m["content"]) for m in msgs))  # get_llm clients are long-lived
+    _COALESCE_COUNTS["calls"] += 1
+    shared = _INFLIGHT.get(key)
+    if shared is not None and not shared.future.done():
+        _COALESCE_COUNTS["coalesced"] += 1
+    else:
+        shared = _INFLIGHT[key] = _Shared(asyncio.ensure_future(llm.ainvoke(msgs)))
+
+        def _done(f: asyncio.Future, shared: _Shared = shared) -> None:
+            if _INFLIGHT.get(key) is shared:
+                del _INFLIGHT[key]
+            if not f.cancelled():
+                f.exception()  # mark retrieved even if every caller went away
+
+        shared.future.add_done_callback(_done)
+
+    shared.waiters += 1
+    try:
+        return await asyncio.shield(shared.future)
+    finally:
+        shared.waiters -= 1
+        if shared.waiters == 0 and not shared.future.done():
+            _COALESCE_COUNTS["abandoned"] += 1
+            if _INFLIGHT.get(key) is shared:
+                del _INFLIGHT[key]  # a new caller must not join a call being cancelled
+            shared.future.cancel()
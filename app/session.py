@@ -1,17 +1,17 @@
 # app/session.py
 import os
-import redis
-import json
-import datetime as dt
+import redis.asyncio as redis
+import orjson
 import decimal
-import uuid
 from typing import Any, Dict
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB   = int(os.getenv("REDIS_DB", 0))
+SESSION_TTL = 1800  # 30 min, refreshed on every save
+MAX_MESSAGES = 50   # chat history kept per session (oldest dropped on save); prompts read only the tail
 
-# Global redis client
+# Global redis client (asyncio; awaited from the async API handlers)
 redis_client = redis.Redis(
     host=REDIS_HOST,
     port=REDIS_PORT,
@@ -20,13 +20,9 @@ redis_client = redis.Redis(
 )
 
 def _json_default(o: Any):
-    """JSON encoder for non-serializable types we may get from DB results."""
-    if isinstance(o, (dt.datetime, dt.date)):
-        return o.isoformat()
+    """JSON encoder for DB result types orjson doesn't cover (it handles datetime/date/UUID natively)."""
     if isinstance(o, decimal.Decimal):
         return float(o)  # switch to str(o) if you need full precision
-    if isinstance(o, uuid.UUID):
-        return str(o)
     return str(o)  # fallback
 
 def _ensure_schema_defaults(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -50,20 +46,109 @@ def _ensure_schema_defaults(state: Dict[str, Any]) -> Dict[str, Any]:
 
     return state
 
-def get_session(session_id: str) -> dict | None:
-    """Fetch session state from Redis. Returns None if not found."""
-    data = redis_client.get(session_id)
-    if not data:
-        return None
-    try:
-        state = json.loads(data)
+# ---------------- storage layout ----------------
+# A session is split over three keys so a turn only rewrites what changed:
+#   sess:{id}:meta         JSON of everything except the two large fields below
+#   sess:{id}:messages     LIST of JSON messages (new turns are RPUSHed)
+#   sess:{id}:last_result  JSON rows of the last DB filter (written only when replaced)
+# Change tracking relies on the API appending to state["messages"] in place and assigning
+# new lists for any rewrite (e.g. the scrub below) or new last_result. The messages LIST is
+# capped at MAX_MESSAGES with LTRIM, so a long session still costs one RPUSH per turn.
+_SPLIT_KEYS = ("messages", "last_result")
+_PERSISTED = "_persisted"  # transient bookkeeping of what Redis holds; never stored
+
+def _keys(session_id: str) -> tuple[str, str, str]:
+    base = f"sess:{session_id}"
+    return f"{base}:meta", f"{base}:messages", f"{base}:last_result"
+
+def _dumps(o: Any) -> bytes:
+    return orjson.dumps(o, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+def _scrub_recommendations(state: Dict[str, Any]) -> None:
+    """One-time cleanup: older runs stored the final answer's recommendations as chat messages."""
+    if state.get("recs_scrubbed"):
+        return
+    final = state.get("final_answer") or {}
+    recs = {r.strip() for r in final.get("recommendations") or [] if isinstance(r, str) and r.strip()}
+    msgs = state.get("messages") or []
+    kept = [
+        m for m in msgs
+        if not (m.get("role") == "assistant" and isinstance(m.get("text"), str) and m["text"].strip() in recs)
+    ]
+    if len(kept) != len(msgs):
+        state["messages"] = kept  # new list -> next save rewrites the history key
+    state["recs_scrubbed"] = True
+
+def _mark_persisted(state: Dict[str, Any]) -> None:
+    msgs = state.get("messages")
+    state[_PERSISTED] = {"messages": msgs, "n_messages": len(msgs or []), "last_result": state.get("last_result")}
+
+async def get_session(session_id: str) -> dict | None:
+    """
+    Fetch session state from Redis (one pipelined round-trip; a miss costs one more GET for the
+    pre-split key). Returns None if not found.
+    """
+    meta_key, msgs_key, rows_key = _keys(session_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(meta_key)
+        pipe.lrange(msgs_key, 0, -1)
+        pipe.get(rows_key)
+        meta, msgs, rows = await pipe.execute()
+    legacy = None
+    if not meta:
+        # pre-split single-blob session (expires within SESSION_TTL); only read on a miss
+        legacy = await redis_client.get(session_id)
+        if not legacy:
+            return None
+    try:  # only decoding is guarded: Redis errors propagate
+        if meta:
+            state = orjson.loads(meta)
+            state["messages"] = [orjson.loads(m) for m in msgs or []]
+            state["last_result"] = orjson.loads(rows) if rows else []
+        else:
+            state = _ensure_schema_defaults(orjson.loads(legacy))
+            state[_PERSISTED] = {"legacy": True}  # first save writes all keys and drops the blob
+            _scrub_recommendations(state)
+            return state
     except Exception:
         return None
-    return _ensure_schema_defaults(state)
+    state = _ensure_schema_defaults(state)
+    _mark_persisted(state)
+    _scrub_recommendations(state)  # after marking, so a scrubbed history counts as rewritten
+    return state
+
+async def save_session(session_id: str, state: dict):
+    """Save session state to Redis (SESSION_TTL expiry on all keys, one MULTI/EXEC)."""
+    meta_key, msgs_key, rows_key = _keys(session_id)
+    seen = state.get(_PERSISTED) or {}
+    msgs = state.get("messages") or []
+    rows = state.get("last_result") or []
+    meta = {k: v for k, v in state.items() if k not in _SPLIT_KEYS and k != _PERSISTED}
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(meta_key, _dumps(meta), ex=SESSION_TTL)
+        if seen.get("legacy"):
+            pipe.delete(session_id)  # migrated off the single-blob key
+
+        if state.get("messages") is seen.get("messages") and len(msgs) >= seen.get("n_messages", 0):
+            new_msgs = msgs[seen.get("n_messages", 0):]  # in-place appends only
+        else:
+            pipe.delete(msgs_key)  # new session or rewritten history
+            new_msgs = msgs
+        if new_msgs:
+            pipe.rpush(msgs_key, *[_dumps(m) for m in new_msgs[-MAX_MESSAGES:]])
+            pipe.ltrim(msgs_key, -MAX_MESSAGES, -1)
+        pipe.expire(msgs_key, SESSION_TTL)
+
+        if _PERSISTED in state and state.get("last_result") is seen.get("last_result"):
+            pipe.expire(rows_key, SESSION_TTL)
+        else:
+            pipe.set(rows_key, _dumps(rows), ex=SESSION_TTL)
 
-def save_session(session_id: str, state: dict):
-    """Save session state to Redis (30min expiry)."""
-    redis_client.set(session_id, json.dumps(state, default=_json_default), ex=1800)
+        await pipe.execute()
+    if len(msgs) > MAX_MESSAGES:
+        state["messages"] = msgs[-MAX_MESSAGES:]  # mirror the LTRIM in memory
+    _mark_persisted(state)
 
 def create_session(session_id: str, user_message: str) -> dict:
     """Create a new session object with default schema."""
@@ -82,18 +167,19 @@ def create_session(session_id: str, user_message: str) -> dict:
         # Results + final answer
         "last_result": [],
         "final_answer": None,
+        "recs_scrubbed": True,     # never had recommendation messages
     }
     return _ensure_schema_defaults(state)
 
-def add_message(session_id: str, role: str, text: str, field_name: str | None = None):
-    """Append one message turn to session."""
-    state = get_session(session_id)
-    if not state:
-        raise ValueError(f"Session {session_id} not found in Redis")
-
-    state["messages"].append({
-        "role": role,
-        "text": text,
+def compact_message(role: str, text: str, field_name: str | None = None) -> dict:
+    """Message in its stored shape: normalized once here so readers can slice history as-is."""
+    return {
+        "role": (role or "user").strip(),
+        "text": (text or "").strip().replace("\n", " "),
         "field_name": field_name
-    })
-    save_session(session_id, state)
+    }
+
+def add_message(state: dict, role: str, text: str, field_name: str | None = None) -> dict:
+    """Append one message turn to the in-memory session; persisted by the caller's save_session."""
+    state.setdefault("messages", []).append(compact_message(role, text, field_name))
+    return state
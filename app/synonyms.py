@@ -1,31 +1,54 @@
 import re
+from types import MappingProxyType
 from .db import qall
-PUNCT = re.compile(r"[^a-z0-9 ]+")
+# Any run of non-alphanumerics (spaces included) collapses to one space: a single pass
+PUNCT = re.compile(r"[^a-z0-9]+")
 
 def clean(s: str|None):
     if not s: return None
-    s = PUNCT.sub(" ", s.lower().strip())
-    return re.sub(r"\s+", " ", s)
+    return PUNCT.sub(" ", s.lower()).strip()
 
-def canon_from_db(kind: str, text: str|None):
+_SYNONYMS: dict = {}  # kind -> read-only {phrase: canonical}
+
+async def _load_synonyms(kind: str):
+    # synonyms table changes rarely: read once per kind per process (reload_synonyms() to refresh)
+    mapping = _SYNONYMS.get(kind)
+    if mapping is None:
+        rows = await qall("SELECT phrase, canonical FROM synonyms WHERE kind=%s", (kind,))
+        mapping = _SYNONYMS[kind] = MappingProxyType({ (r["phrase"].lower()): r["canonical"] for r in rows })
+    return mapping
+
+def reload_synonyms():
+    _SYNONYMS.clear()
+
+async def canon_from_db(kind: str, text: str|None):
     if not text: return None
-    t = clean(text)
-    rows = qall("SELECT phrase, canonical FROM synonyms WHERE kind=%s", (kind,))
-    mapping = { (r["phrase"].lower()): r["canonical"] for r in rows }
-    return mapping.get(t, text)
+    return (await _load_synonyms(kind)).get(clean(text), text)
+
+# Keyword tables as one alternation each: a single finditer pass collects which groups
+# occur, then the original precedence is applied to that set.
+_WORKLOAD_RE = re.compile(
+    r"(?P<ba>dynamics|business applications|business apps)|(?P<hint>d365|biz apps)|(?P<business>business)"
+)
+_INC_TYPE_RE = re.compile(r"(?P<csp>csp)|(?P<pre>pre)|(?P<post>post)|(?P<sale>sale)")
 
-def canon_workload(s: str|None):
+async def canon_workload(s: str|None):
     v = clean(s) or ""
-    if any(k in v for k in ["d365","dynamics","business applications","business apps","biz apps"]):
-        return "Business Applications" if "business" in v or "dynamics" in v else "D365"
-    return canon_from_db("workload", s) or s
+    found = {m.lastgroup for m in _WORKLOAD_RE.finditer(v)}
+    if "ba" in found:
+        return "Business Applications"
+    if "hint" in found:
+        return "Business Applications" if "business" in found else "D365"
+    return await canon_from_db("workload", s) or s
 
-def canon_incentive_type(s: str|None):
+async def canon_incentive_type(s: str|None):
     v = clean(s) or ""
-    if "csp" in v: return "csp_transaction"
-    if "pre" in v and "sale" in v: return "pre_sales"
-    if "post" in v and "sale" in v: return "post_sales"
-    return canon_from_db("incentive_type", s) or s
+    found = {m.lastgroup for m in _INC_TYPE_RE.finditer(v)}
+    if "csp" in found: return "csp_transaction"
+    if "sale" in found:
+        if "pre" in found: return "pre_sales"
+        if "post" in found: return "post_sales"
+    return await canon_from_db("incentive_type", s) or s
 
 def canon_bool(s: str|None):
     if s is None: return None
@@ -0,0 +1,11 @@
+# gunicorn.conf.py — production server; picked up by `gunicorn main:app` from the repo root
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# uvicorn worker: asyncio on uvloop with the httptools parser (both in requirements.txt)
+worker_class = "uvicorn_worker.UvicornWorker"
+# one event loop per process; in-process caches (router/intent/hints) are per worker
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+timeout = 120   # a cold turn chains several LLM calls
+keepalive = 5   # behind a reverse proxy (TLS terminates there)
@@ -1,11 +1,24 @@
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import router as api_router
+from app.db import open_pool, close_pool
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="BizApps Incentives Agent")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # docqa and field validation still run in the threadpool (AnyIO default: 40 threads)
+    to_thread.current_default_thread_limiter().total_tokens = 100
+    await open_pool()
+    try:
+        yield
+    finally:
+        await close_pool()
+
+app = FastAPI(title="BizApps Incentives Agent", lifespan=lifespan)
 
 # CORS: allow all origins, methods, and headers
 app.add_middleware(
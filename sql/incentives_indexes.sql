@@ -0,0 +1,34 @@
+-- Indexes for app/agents/db_filter_service.filter_incentives.
+--
+-- The filter only ever uses {name, workload, incentive_type}:
+--   LOWER(name) IN (...)                      exact, case-insensitive
+--   LOWER(incentive_type) IN (...)            exact, case-insensitive
+--   workload ILIKE '%...%' [OR ...]           substring
+--   ORDER BY name LIMIT n                     first page only
+--
+-- Plain btrees on (workload, incentive_type, name) would not be used: the predicates
+-- wrap the columns in LOWER() / leading-wildcard ILIKE. The query is SELECT *, so an
+-- INCLUDE (...) covering index could not give index-only scans either; these indexes
+-- target the predicates and the sort order instead.
+--
+-- CONCURRENTLY avoids blocking writes but cannot run inside a transaction block:
+--   psql "$DATABASE_URL" -f sql/incentives_indexes.sql
+-- Verify with EXPLAIN (ANALYZE, BUFFERS) on the SQL built by db_filter_service._build_sql.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- name fast path: LOWER(name) = ... then ORDER BY name straight from the index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_incentives_lower_name
+    ON incentives (LOWER(name), name);
+
+-- workload + incentive_type branch: equality on the type, name order within it
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_incentives_lower_type_name
+    ON incentives (LOWER(incentive_type), name);
+
+-- workload substring (ILIKE '%x%') needs trigrams
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_incentives_workload_trgm
+    ON incentives USING gin (workload gin_trgm_ops);
+
+-- unfiltered ORDER BY name LIMIT n and the catalog's SELECT DISTINCT name
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_incentives_name
+    ON incentives (name);
@@ -0,0 +1,80 @@
+"""Per-request connection reuse in app.db: one checkout per DB phase, released when it ends."""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import app.db as db
+
+
+class _Cursor:
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    async def execute(self, sql, params):
+        self.log.append(sql)
+
+    async def fetchall(self):
+        return [{"ok": 1}]
+
+
+class _Conn:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self, row_factory=None):
+        return _Cursor(self.log)
+
+
+class _Checkout:
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        self.log.append("checkout")
+        return _Conn(self.log)
+
+    async def __aexit__(self, *exc):
+        self.log.append("release")
+
+
+class _Pool:
+    def __init__(self):
+        self.log = []
+
+    def connection(self):
+        return _Checkout(self.log)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    p = _Pool()
+    monkeypatch.setattr(db, "pool", p)
+    return p
+
+
+def test_connection_is_shared_within_a_phase_and_released_after_it(pool):
+    app = FastAPI()
+
+    @app.get("/t", dependencies=[Depends(db.request_connection)])
+    async def handler():
+        await asyncio.gather(db.qall("a"), db.qall("b"))  # concurrent first queries: one checkout
+        await db.release_connection()
+        pool.log.append("llm call")  # nothing held here
+        await db.qone("c")
+        return {}
+
+    assert TestClient(app).get("/t").status_code == 200
+    assert pool.log == ["checkout", "a", "b", "release", "llm call", "checkout", "c", "release"]
+
+
+def test_queries_outside_a_request_check_out_per_query(pool):
+    assert asyncio.run(db.qall("z")) == [{"ok": 1}]
+    assert pool.log == ["checkout", "z", "release"]
@@ -0,0 +1,34 @@
+"""Deterministic short-circuit of the final answer: "not listed" only when nothing could answer."""
+from app.agents.final_answer_agent import _NOT_LISTED, _direct_answer
+
+_ROW = {
+    "name": "ERP Envisioning Workshop",
+    "customer_qualification": "",
+    "partner_qualification": "Solutions Partner for Business Applications",
+    "activity_requirement": "",
+    "min_hours": 8,
+    "goal": None,
+}
+
+
+def test_partner_eligibility_goes_to_the_llm_when_partner_columns_are_filled():
+    q = "Is our partner eligible for the ERP Envisioning Workshop?"
+    assert _direct_answer(q, {}, [_ROW]) is None
+
+
+def test_requirements_question_goes_to_the_llm_when_min_hours_is_filled():
+    assert _direct_answer("What are the requirements and min hours?", {}, [_ROW]) is None
+
+
+def test_not_listed_when_every_candidate_column_is_empty():
+    out = _direct_answer("What is the goal of this workshop?", {}, [_ROW])
+    assert out is not None and out["answer_text"] == _NOT_LISTED
+
+
+def test_partly_unmatched_question_goes_to_the_llm():
+    assert _direct_answer("What is the goal and who can deliver it?", {}, [_ROW]) is None
+
+
+def test_not_listed_when_every_clause_maps_to_empty_columns():
+    out = _direct_answer("What is the goal, and what is the purpose?", {}, [_ROW])
+    assert out is not None and out["answer_text"] == _NOT_LISTED
@@ -0,0 +1,35 @@
+"""Rule fast path of the intent detector: calculator routing needs an explicit ask plus real hours/ACV."""
+import pytest
+
+from app.agents.intent_detector import detect_intent_fast
+
+
+@pytest.mark.parametrize("text", [
+    "What are the min hours for the D365 workshop?",
+    "how many hours is the Envisioning workshop for D365",
+    "What's the ACV requirement for D365?",
+    "min 8 hours for the D365 workshop?",
+    "minimum 8 hours for the D365 workshop?",
+    "D365 hours?",
+])
+def test_product_digits_and_min_hours_are_not_calc_inputs(text):
+    assert detect_intent_fast(text) != "calc_presales_workshop_payout"
+
+
+@pytest.mark.parametrize("text", [
+    "Is a customer with 250k ACV eligible for the ERP workshop?",
+    "Is our partner eligible if we run 16 hours?",
+    "We have a $500k ACV deal, which engagement do you recommend?",
+    "we have $250k ACV and 16 hours",
+])
+def test_numeric_inputs_without_a_calc_ask_are_left_to_the_llm(text):
+    assert detect_intent_fast(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "Calculate a workshop of 8 hours with ACV 250k for D365 in France",
+    "Estimate it: ACV is $120,000 and 10 hrs",
+    "compute the payout for a 7.5h workshop",
+])
+def test_calc_ask_with_quantities_next_to_their_unit_is_workshop_calc(text):
+    assert detect_intent_fast(text) == "calc_presales_workshop_payout"
@@ -0,0 +1,63 @@
+"""In-flight coalescing of identical LLM calls (app.llm.ainvoke_shared)."""
+import asyncio
+
+import app.llm as llm
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, msgs):
+        self.started += 1
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return msgs[-1]["content"]
+
+
+def _msgs(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_identical_concurrent_calls_share_one_request():
+    fake = _FakeLLM()
+
+    async def main():
+        return await asyncio.gather(*(llm.ainvoke_shared(fake, _msgs("a")) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["a"] * 4
+    assert fake.started == 1
+
+
+def test_cancelling_one_waiter_keeps_the_call_for_the_others():
+    fake = _FakeLLM()
+
+    async def main():
+        first = asyncio.ensure_future(llm.ainvoke_shared(fake, _msgs("b")))
+        second = asyncio.ensure_future(llm.ainvoke_shared(fake, _msgs("b")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "b"
+    assert fake.started == 1 and fake.cancelled == 0
+
+
+def test_last_waiter_leaving_cancels_the_call():
+    fake = _FakeLLM()
+
+    async def main():
+        only = asyncio.ensure_future(llm.ainvoke_shared(fake, _msgs("c")))
+        await asyncio.sleep(0.01)
+        only.cancel()
+        await asyncio.sleep(0.01)
+        again = await llm.ainvoke_shared(fake, _msgs("c"))  # starts a fresh call
+        return again
+
+    assert asyncio.run(main()) == "c"
+    assert fake.cancelled == 1 and fake.started == 2
+    assert llm.coalesce_stats()["in_flight"] == 0
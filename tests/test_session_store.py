@@ -0,0 +1,116 @@
+"""Split-key session store (app.session) against a minimal in-memory Redis."""
+import asyncio
+
+import orjson
+import pytest
+
+import app.session as session
+
+
+class _Pipe:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        out = [await getattr(self.redis, n)(*a, **k) for n, a, k in self.queued]
+        self.queued = []
+        return out
+
+
+class _Redis:
+    def __init__(self):
+        self.data = {}
+        self.reads = []
+
+    def pipeline(self, transaction=True):
+        return _Pipe(self)
+
+    async def get(self, key):
+        self.reads.append(key)
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def lrange(self, key, start, end):
+        self.reads.append(key)
+        return list(self.data.get(key, []))
+
+    async def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    async def ltrim(self, key, start, end):
+        self.data[key] = self.data.get(key, [])[start:] if end == -1 else self.data[key][start:end + 1]
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def expire(self, key, ttl):
+        return None
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    r = _Redis()
+    monkeypatch.setattr(session, "redis_client", r)
+    return r
+
+
+def test_split_session_read_skips_the_legacy_key(redis):
+    async def main():
+        state = session.create_session("s1", "hi")
+        session.add_message(state, "user", "hi")
+        await session.save_session("s1", state)
+        redis.reads.clear()
+        return await session.get_session("s1")
+
+    state = asyncio.run(main())
+    assert state["messages"][0]["text"] == "hi"
+    assert "s1" not in redis.reads
+
+
+def test_legacy_blob_is_migrated_and_deleted_on_first_save(redis):
+    legacy = session.create_session("s2", "old")
+    legacy["messages"] = [{"role": "user", "text": "old", "field_name": None}]
+    redis.data["s2"] = orjson.dumps(legacy)
+
+    async def main():
+        state = await session.get_session("s2")
+        session.add_message(state, "assistant", "new")
+        await session.save_session("s2", state)
+        return await session.get_session("s2")
+
+    state = asyncio.run(main())
+    assert "s2" not in redis.data
+    assert [m["text"] for m in state["messages"]] == ["old", "new"]
+
+
+def test_redis_errors_on_the_legacy_read_propagate(redis, monkeypatch):
+    split_get = redis.get
+
+    async def get(key):
+        if key == "s3":  # the split keys read fine; the fallback GET fails
+            raise ConnectionError("redis down")
+        return await split_get(key)
+
+    monkeypatch.setattr(redis, "get", get)
+    with pytest.raises(ConnectionError):
+        asyncio.run(session.get_session("s3"))
+
+
+def test_undecodable_legacy_blob_reads_as_missing(redis):
+    redis.data["s4"] = b"not json"
+    assert asyncio.run(session.get_session("s4")) is None
@@ -0,0 +1,133 @@
+"""
+doc_qa escape hatch in /message: the tasks started ahead of the router (intent detection,
+continuation check, field resolution) must survive a failing doc_qa so the turn falls back
+to the incentive flow instead of dying on a cancelled task.
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.api as api
+from app.intent_catalog import INTENTS
+
+_EARNING = next(i for i in INTENTS if i["topic"] == "earning_amount")
+
+
+class _Graph:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, state):
+        self.calls += 1
+        await asyncio.sleep(0.01)  # still running while the router/doc_qa branch executes
+        return {**state, "intent": {"topic": "earning_amount", "intent": _EARNING}}
+
+
+@pytest.fixture
+def env(monkeypatch):
+    store = {}
+    graph = _Graph()
+    docqa = {"fail": True}
+
+    async def get_session(sid):
+        return store.get(sid)
+
+    async def save_session(sid, state):
+        store[sid] = state
+
+    async def route_message(msg, session=None, **_):
+        return {"route": "doc_qa", "by": "rule", "scores": {"confidence": 0.85, "why": "test"}}
+
+    def docqa_turn(question, session):
+        if docqa["fail"]:
+            raise RuntimeError("doc index down")
+        session["final_answer"] = {"answer_text": "From the docs.", "sources": []}
+        return session
+
+    async def detect_continuation(msg, session):
+        await asyncio.sleep(0.01)
+        return {"is_continuation": False}
+
+    async def resolve_field_from_message(field, msg):
+        await asyncio.sleep(0.01)
+        return {"field_name": field, "value": "France", "candidates": []}
+
+    async def load_catalog():
+        return None
+
+    def validate_fields(msg, req_expr):
+        return {
+            "required_fields_object": {"name": ["ERP Envisioning Workshop"]},
+            "picked_set": ["name"],
+            "candidates": {},
+        }
+
+    async def run_db_filter(s, **_):
+        s["last_result"] = [{"name": "ERP Envisioning Workshop"}]
+        return s
+
+    async def run_final_answer(s, override_message=None):
+        s["final_answer"] = {"answer_text": "Incentive answer.", "recommendations": []}
+        return s
+
+    async def generate_followup_question(**_):
+        return "Which workload is this for?"
+
+    monkeypatch.setattr(api, "get_session", get_session)
+    monkeypatch.setattr(api, "save_session", save_session)
+    monkeypatch.setattr(api, "route_message", route_message)
+    monkeypatch.setattr(api, "_docqa_turn", docqa_turn)
+    monkeypatch.setattr(api, "app_graph", graph)
+    monkeypatch.setattr(api, "detect_continuation", detect_continuation)
+    monkeypatch.setattr(api, "resolve_field_from_message", resolve_field_from_message)
+    monkeypatch.setattr(api, "load_catalog", load_catalog)
+    monkeypatch.setattr(api, "_validate_fields", validate_fields)
+    monkeypatch.setattr(api, "_run_db_filter", run_db_filter)
+    monkeypatch.setattr(api, "_run_final_answer", run_final_answer)
+    monkeypatch.setattr(api, "generate_followup_question", generate_followup_question)
+
+    app = FastAPI()
+    app.include_router(api.router)
+    return {"client": TestClient(app), "store": store, "graph": graph, "docqa": docqa}
+
+
+def test_text_turn_falls_back_when_doc_qa_raises(env):
+    r = env["client"].post("/message", json={"user_message": "How much does ERP pay?", "input_type": "text"})
+
+    assert r.status_code == 200
+    assert r.json()["response_type"] == "final_answer"
+    assert r.json()["text"] == "Incentive answer."
+    assert env["graph"].calls == 1  # the early intent task was reused, not cancelled
+
+
+def test_text_turn_with_prior_result_falls_back_when_doc_qa_raises(env):
+    env["store"]["s1"] = {**api.create_session("s1", "earlier"), "last_result": [{"name": "X"}]}
+
+    r = env["client"].post(
+        "/message", json={"session_id": "s1", "user_message": "and the rate?", "input_type": "text"}
+    )
+
+    assert r.status_code == 200
+    assert r.json()["text"] == "Incentive answer."
+
+
+def test_followup_turn_falls_back_when_doc_qa_raises(env):
+    r = env["client"].post(
+        "/message",
+        json={"user_message": "France", "input_type": "followup", "current_field": "country"},
+    )
+
+    assert r.status_code == 200
+    sid = r.json()["session_id"]
+    assert env["store"][sid]["required_fields"]["country"] == ["France"]
+
+
+def test_text_turn_doc_qa_success_answers_from_docs(env):
+    env["docqa"]["fail"] = False
+
+    r = env["client"].post("/message", json={"user_message": "Where do I submit POE?", "input_type": "text"})
+
+    assert r.status_code == 200
+    assert r.json()["text"] == "From the docs."
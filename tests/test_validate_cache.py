@@ -0,0 +1,25 @@
+"""Field validation memo in /message: results from an empty catalog must not stick."""
+import app.api as api
+
+
+def _count_calls(monkeypatch, ready):
+    calls = []
+
+    def validator(user_message, required_fields):
+        calls.append(user_message)
+        return {"required_fields_object": {}, "picked_set": [], "candidates": {}}
+
+    api._VALIDATE_CACHE.clear()
+    monkeypatch.setattr(api, "field_validator_v1", validator)
+    monkeypatch.setattr(api, "catalog_ready", lambda: ready)
+    api._validate_fields("ERP workshop", ["name"])
+    api._validate_fields("ERP workshop", ["name"])
+    return calls
+
+
+def test_results_are_not_cached_while_the_catalog_is_empty(monkeypatch):
+    assert len(_count_calls(monkeypatch, ready=False)) == 2
+
+
+def test_results_are_cached_once_the_catalog_is_loaded(monkeypatch):
+    assert len(_count_calls(monkeypatch, ready=True)) == 1